@@ -14,6 +14,16 @@ calibrate = True       # Create a calibration image file with calibration hash m
 cal_obj_px = 90        # Length of a calibration object in pixels
 cal_obj_mm = 4700.0    # Length of the calibration object in millimetres (longer is faster)
 # Note if tested speed is too low increase cal_obj_mm  value and redo speed test.
+cal_homography_on = False  # True= Use 4 points below for camera at an angle to road. False= Use cal_obj_px, cal_obj_mm
+cal_image_points = [(40, 80), (280, 80), (300, 180), (20, 180)]  # Image stream px x,y of 4 road points
+cal_world_points = [(0, 0), (9000, 0), (9000, 6000), (0, 6000)] # Same 4 road points in mm (along road, across road)
+cal_lanes = []         # Default= [] Off or per lane (direction, y_min, y_max, cal_obj_px, cal_obj_mm) list
+                       # direction "L2R", "R2L" or "" either. y band is crop area px of object centre, y_max 0=any
+                       # eg cal_lanes = [("L2R", 0, 55, 90, 4700.0), ("R2L", 55, 110, 110, 4700.0)]
+autocal_on = False     # True= Suggest cal_obj_px for cal_obj_mm (typical car length) from tracked car widths
+autocal_path = "data/speed_autocal.txt"  # Default= "data/speed_autocal.txt" suggested calibration settings file
+autocal_min_tracks = 50  # Default= 50 Number of tracks needed before suggesting calibration
+autocal_class = "Vehicle"  # Default= "Vehicle" obj_class_rules class of tracks used for autocal  "" = All
 # IMPORTANT - If plugins Enabled Edit Settings in specified plugin file located in plugins folder.
 
 # Plugins overlay the config.py variable settings
@@ -45,7 +55,12 @@ show_crop_on = False   # Same as show_thresh_on but in color. True=Show, False=D
 verbose = True         # True= Display basic status information on console False= Off
 display_fps = False    # True= Show average frame count every 1000 loops False= Off
 log_data_to_CSV = True # True= Save log data as CSV comma separated values  False= Off
+csv_max_mb = 10        # Default= 10 Start a new dated CSV file when the CSV file is bigger than this 0= Off
+csv_rotate_daily = False # Default= False True= Start a new dated CSV file each day
+csv_flush_sec = 5.0    # Default= 5.0 Seconds between saving CSV data to disk
 loggingToFile = False  # True= Send logging to file False= No Logging to File
+db_commit_events = 10  # Default= 10 Commit speed database rows after this many events or
+db_commit_ms = 2000    # Default= 2000 milliseconds after the first waiting row, whichever is first
 logFilePath = 'speed-cam.log'  # Location of log file when logDataToFile=True
 
 # Motion Event Settings
@@ -54,15 +69,35 @@ SPEED_MPH = False      # Set Speed Units   kph=False  mph=True
 track_counter = 5      # 1core=5 4cores=10 + Number of Consecutive Motion Events to trigger speed photo
                        # Testing with RPI2 B 1core using opencv ver 3.4.2
 MIN_AREA = 100         # Default= 100 Exclude all contours less than or equal to this sq-px Area
-track_len_trig = 70    # NOT USED. Used for version 8.87 or earlier see speed-cam_887.py
+track_trigger = "count" # Default= "count" When to end a track and log speed. One of the options below
+                       # "count" track_counter motion events, "distance" track_len_trig px travelled
+                       # "time" track_time_trig seconds tracked, "lines" crossed both track_trig_lines
+track_len_trig = 70    # Default= 70 px travelled to end track if track_trigger = "distance"
+track_time_trig = 0.5  # Default= 0.5 seconds tracked to end track if track_trigger = "time"
+track_trig_lines = (60, 210)  # Default= (60, 210) crop area x px entry and exit lines if track_trigger = "lines"
 show_out_range = True  # Default= True Show Out of Range Events per x_diff settings below False= Off
-x_diff_max = 20        # Default= 20 Exclude if max px away >= last motion event x position
+x_diff_max = 20        # Default= 20 Exclude if max px away >= predicted motion event x position
 x_diff_min = 1         # Default= 1 Exclude if min px away <= last event x position
 x_buf_adjust = 10      # Default= 10 Divides motion Rect x for L&R Buffer Space to Ensure contours are in
-track_timeout = 0.0    # Default= 0.0 Optional seconds to wait after track End (Avoids dual tracking)
+track_timeout = 0.0    # Default= 0.0 Optional seconds of no new tracks after track End (Avoids dual tracking)
+track_timeout_zone_only = True # Default= True Only block new tracks near the ended object False= Anywhere
 event_timeout = 0.3    # Default= 0.3 seconds to wait for next motion event before starting new track
+track_max_objects = 4  # Default= 4 Max number of moving objects tracked at the same time
+track_window_on = True # Default= True While tracking only search for motion near predicted object positions
+track_full_scan_frames = 4  # Default= 4 While tracking search the full crop area every this many frames
+blob_record_path = ""  # Default= "" Off or file path to record motion blobs for replay by tracker-bench.py
+track_fit_quality = 0.8 # Default= 0.8 Exclude track if speed line fit quality 0-1 is less than this 0=off
 max_speed_over = 0     # Exclude track if Speed less than or equal to value specified 0=All
                        # Can be useful to exclude pedestrians and/or bikes, Etc or track only fast objects
+dup_check_on = True    # Default= True Check if a track looks like a recent one going the same way
+dup_drop = False       # Default= False Save and flag duplicate in database. True= Do not save duplicates
+dup_window_sec = 3.0   # Default= 3.0 seconds after a track end that a similar track is a duplicate
+dup_max_bits = 10      # Default= 10 of 64 image hash bits that can differ for a duplicate (lower is stricter)
+# Object class rules. First rule where all limits hold gives the class saved with the speed data.
+# Limits are min_ or max_ of aspect (w/h), area (sq-px), speed (speed units), duration (sec)  [] = Off
+obj_class_rules = [("Person", {"max_aspect": 0.73, "max_speed": 20}),
+                   ("Bike", {"max_aspect": 1.1, "max_speed": 60}),
+                   ("Vehicle", {})]
 
 # Camera Settings
 # ---------------
@@ -96,6 +131,33 @@ image_text_bottom = True      # True= Show image text at bottom otherwise at top
 image_font_size = 12          # Default= 12 Font text height in px for text on images
 image_bigger = 3.0            # Default= 3.0 Resize saved speed image by specified multiplier value
 image_max_files = 0           # 0=off or specify MaxFiles to maintain then oldest are deleted  Default=0 (off)
+image_queue_max = 8           # Default= 8 Max speed images waiting to be saved in background 0= Save before tracking continues
+image_thumb_width = 160       # Default= 160 px wide thumbnail saved with each speed image for reports 0= Off
+image_thumb_path = "media/thumbs"  # Default= "media/thumbs" thumbnail folder. Same file names as speed images. Pruned by image_max_files
+image_save_mode = "full"      # Default= "full" Save annotated image resized by image_bigger
+                              # "crop" Save native resolution object crop plus a small context image.
+                              # Object and crop positions are saved in the database instead of drawn
+image_crop_pad = 24           # Default= 24 px of camera image kept around the object in crop mode
+image_context_scale = 0.5     # Default= 0.5 Context image size multiplier of the camera image in crop mode
+image_context_path = "media/context"  # Default= "media/context" crop mode context image folder. Pruned by image_max_files
+
+# Optional Pack File Image Store (webserver.py serves images at /packs/ under web_server_root)
+# -----------------------------------------------------------------------------------------
+image_pack_on = False         # Default= False True= Append speed images to one pack file per day instead of jpg files
+image_pack_dir = "media/packs"  # Default= "media/packs" Pack files and pack_index.db folder. Use speed_pack.py to extract
+image_pack_max_days = 0       # Default= 0 Delete whole packs older than this many days 0= Keep all
+                              # Packed images are not copied to imageRecentDir or counted by image_max_files
+
+# Optional Speed Event Video Clips
+# --------------------------------
+clip_on = False               # Default= False True= Save a video clip of the seconds around each speed event
+clip_path = "media/clips"     # Default= "media/clips" folder to store clips named the same as speed images
+clip_pre_sec = 3.0            # Default= 3.0 Seconds of video kept in memory before each speed event
+clip_post_sec = 2.0           # Default= 2.0 Seconds of video recorded after each speed event
+clip_scale = 0.5              # Default= 0.5 Clip frame size multiplier of the camera image size
+clip_jpeg_quality = 75        # Default= 75 JPEG quality of frames held in memory
+clip_max_mb = 32              # Default= 32 Max MB of frames held in memory. Oldest frames are dropped first
+clip_fourcc = "MJPG"          # Default= "MJPG" saves .avi  "mp4v" saves .mp4
 
 # Optional Manage SubDir Creation by time, number of files or both (not recommended)
 # ----------------------------------------------------------------
@@ -124,6 +186,13 @@ WINDOW_BIGGER = 1.0           # Default= 1.0 Resize multiplier for opencv window
 BLUR_SIZE = 10                # Default= 10 OpenCV setting for Gaussian difference image blur
 THRESHOLD_SENSITIVITY = 20    # Default= 20 OpenCV setting for difference image threshold
 
+# Motion Heatmap Settings (Use heatmap-roi.py to view and suggest crop area)
+# ----------------------------------------------------------------------------
+heatmap_on = False            # True= Accumulate threshold motion into a heatmap file  False= Off
+heatmap_path = "data/speed_heatmap.npy"  # Default= "data/speed_heatmap.npy" numpy float32 heatmap file
+heatmap_scale = 4             # Default= 4 Heatmap cell size in px (bigger is smaller file and less cpu)
+heatmap_save_sec = 300        # Default= 300 seconds between saving heatmap to heatmap_path
+
 #======================================
 #       webserver.py Settings
 #======================================
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+heatmap-roi.py written for speed-cam.py
+Render the speed-cam.py motion heatmap over a camera image and suggest
+tighter x_left, x_right, y_upper, y_lower crop area settings (plus an
+optional polygon) that cover the real traffic.
+
+Set config.py heatmap_on = True and let speed-cam.py run for a few hours
+or days so the heatmap at heatmap_path collects enough motion. Then run
+
+    ./heatmap-roi.py
+    ./heatmap-roi.py -i media/images/calib-20190101-1200001.jpg -c 0.98
+
+The overlay image is saved to media/heatmap.jpg so it can be viewed
+using webserver.py. A smaller crop area means less opencv processing.
+"""
+from __future__ import print_function
+print("Loading ...")
+import os
+import sys
+import glob
+import logging
+import argparse
+
+logging.basicConfig(level=logging.DEBUG,
+                    format='%(asctime)s %(levelname)-8s %(funcName)-10s %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+try:
+    import cv2
+except ImportError:
+    logging.error("Could Not import cv2 library. Install opencv per Readme.md")
+    sys.exit(1)
+import numpy as np
+
+progVer = "1.00"
+mypath = os.path.abspath(__file__)  # Find the full path of this python script
+baseDir = os.path.dirname(mypath)
+progName = os.path.basename(__file__)
+os.chdir(baseDir)
+from config import *
+
+cvBlue = (255, 0, 0)
+cvGreen = (0, 255, 0)
+cvRed = (0, 0, 255)
+
+# crop mode speed images are object crops so draw over a context image
+if globals().get("image_save_mode", "full") == "crop":
+    overlay_path = globals().get("image_context_path", "media/context")
+else:
+    overlay_path = image_path
+
+ap = argparse.ArgumentParser(description="Suggest speed-cam crop area from motion heatmap")
+ap.add_argument("-m", "--heatmap", default=heatmap_path,
+                help="heatmap .npy file Default=%s" % heatmap_path)
+ap.add_argument("-i", "--image", default=None,
+                help="image to draw heatmap over. Default=newest jpg in %s" % overlay_path)
+ap.add_argument("-o", "--output", default="media/heatmap.jpg",
+                help="overlay image output path Default=media/heatmap.jpg")
+ap.add_argument("-c", "--coverage", type=float, default=0.98,
+                help="fraction of motion the suggested crop area must cover Default=0.98")
+ap.add_argument("-t", "--thresh", type=float, default=0.10,
+                help="fraction of peak heat used for polygon outline Default=0.10")
+ap.add_argument("-s", "--scale", type=int, default=heatmap_scale,
+                help="heatmap cell size in px used when recorded Default=%i" % heatmap_scale)
+args = ap.parse_args()
+
+#------------------------------------------------------------------------------
+def newest_image(path):
+    """ Return the most recent jpg image under path or None """
+    files = glob.glob(os.path.join(path, "*.jpg"))
+    files.extend(glob.glob(os.path.join(path, "*", "*.jpg")))
+    if not files:
+        return None
+    return max(files, key=os.path.getmtime)
+
+#------------------------------------------------------------------------------
+def heat_bounds(totals, coverage):
+    """
+    Return first and last index of a row or column totals array
+    that together contain coverage fraction of all the motion
+    """
+    cum = np.cumsum(totals)
+    tail = cum[-1] * (1.0 - coverage) / 2.0
+    first = int(np.searchsorted(cum, tail, side='right'))
+    last = int(np.searchsorted(cum, cum[-1] - tail, side='left'))
+    return first, min(last, len(totals) - 1)
+
+#------------------------------------------------------------------------------
+def suggest_roi(heat, scale, coverage):
+    """ Return suggested x_left, x_right, y_upper, y_lower in stream px """
+    x1, x2 = heat_bounds(heat.sum(axis=0), coverage)
+    y1, y2 = heat_bounds(heat.sum(axis=1), coverage)
+    return x1 * scale, (x2 + 1) * scale, y1 * scale, (y2 + 1) * scale
+
+#------------------------------------------------------------------------------
+def suggest_polygon(heat, scale, thresh):
+    """ Return a simplified convex polygon in stream px around the hot cells """
+    mask = (heat >= heat.max() * thresh).astype(np.uint8) * 255
+    # [-2] works with opencv 2, 3 and 4 findContours return values
+    contours = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                                cv2.CHAIN_APPROX_SIMPLE)[-2]
+    if not contours:
+        return []
+    hull = cv2.convexHull(max(contours, key=cv2.contourArea))
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+    return [(int(p[0][0] * scale), int(p[0][1] * scale)) for p in approx]
+
+#------------------------------------------------------------------------------
+def make_overlay(heat, image, roi, polygon, scale):
+    """ Blend a colour heatmap over image and draw current and suggested crop areas """
+    img_h, img_w = image.shape[:2]
+    # saved speed images are resized by image_bigger so work out px multiplier
+    mult = float(img_w) / (heat.shape[1] * scale)
+    norm = cv2.normalize(np.sqrt(heat), None, 0, 255, cv2.NORM_MINMAX)
+    color = cv2.applyColorMap(cv2.resize(norm.astype(np.uint8), (img_w, img_h)),
+                              cv2.COLORMAP_JET)
+    overlay = cv2.addWeighted(image, 0.6, color, 0.4, 0)
+    def box(x1, x2, y1, y2, color):
+        cv2.rectangle(overlay, (int(x1 * mult), int(y1 * mult)),
+                      (int(x2 * mult), int(y2 * mult)), color, 2)
+    box(x_left, x_right, y_upper, y_lower, cvBlue)
+    box(roi[0], roi[1], roi[2], roi[3], cvRed)
+    if polygon:
+        pts = np.array([(int(x * mult), int(y * mult)) for x, y in polygon],
+                       dtype=np.int32)
+        cv2.polylines(overlay, [pts], True, cvGreen, 1)
+    return overlay
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if not os.path.isfile(args.heatmap):
+        logging.error("Heatmap File Not Found %s", args.heatmap)
+        logging.info("Set config.py heatmap_on = True and Run speed-cam.py to Collect Motion")
+        sys.exit(1)
+    heat = np.load(args.heatmap)
+    if heat.max() <= 0:
+        logging.error("Heatmap %s Has No Motion Recorded Yet", args.heatmap)
+        sys.exit(1)
+    roi = suggest_roi(heat, args.scale, args.coverage)
+    polygon = suggest_polygon(heat, args.scale, args.thresh)
+    print("----------------------- Suggested Crop Area -----------------------")
+    print("  Covers %.1f%% of Recorded Motion in %s" % (args.coverage * 100, args.heatmap))
+    print("")
+    print("  x_left  = %-4i  # Current %i" % (roi[0], x_left))
+    print("  x_right = %-4i  # Current %i" % (roi[1], x_right))
+    print("  y_upper = %-4i  # Current %i" % (roi[2], y_upper))
+    print("  y_lower = %-4i  # Current %i" % (roi[3], y_lower))
+    print("")
+    roi_area = (roi[1] - roi[0]) * (roi[3] - roi[2])
+    cur_area = max(1, (x_right - x_left) * (y_lower - y_upper))
+    print("  Crop Area %i sq-px is %.0f%% of Current %i sq-px"
+          % (roi_area, 100.0 * roi_area / cur_area, cur_area))
+    if polygon:
+        print("  Traffic Polygon %s" % polygon)
+    print("")
+    image_file = args.image
+    if image_file is None:
+        image_file = newest_image(overlay_path)
+    if image_file is None or not os.path.isfile(image_file):
+        logging.warn("No Image Found to Draw Heatmap Over. Use -i option")
+    else:
+        image = cv2.imread(image_file)
+        overlay = make_overlay(heat, image, roi, polygon, args.scale)
+        out_dir = os.path.dirname(args.output)
+        if out_dir and not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        cv2.imwrite(args.output, overlay)
+        logging.info("Saved Heatmap Overlay of %s to %s", image_file, args.output)
+        logging.info("Blue=Current Crop Area  Red=Suggested  Green=Traffic Polygon")
+    print("  Edit config.py or plugin crop settings then Restart speed-cam.py")
+    print("%s %s Done" % (progName, progVer))
@@ -8,10 +8,10 @@ progVer = "6.70"
 
 import glob
 import os
-import csv
 import time
 import datetime
-import shutil
+from speed_csv import csv_segments, csv_rows
+from speed_pack import PackStore, PACK_INDEX
 
 # Find the full path of this python script
 progName = os.path.abspath(__file__)
@@ -24,8 +24,10 @@ os.chdir(baseDir)
 verbose = True
 image_ext = ".jpg"
 source_csv = "speed-cam.csv"
+html_days = 0    # 0=all csv files. Only read rotated csv files with events in the last html_days days
 web_html_dir = "media/html"  # Dir path to html files
 web_image_dir = "media/images/"   # Dir path of images
+web_pack_dir = "media/packs/"     # Dir path of speed-cam.py image_pack_on pack files
 # contour width to height ratio
 guess_person = .73
 guess_cart = 1.1
@@ -35,6 +37,23 @@ if not os.path.isdir(web_html_dir):
     print("Creating html Folder %s" % web_html_dir)
     os.makedirs(web_html_dir)
 
+# Packed images are looked up in the pack index. Their html links point
+# under web_pack_dir where webserver.py serves them from their pack file
+pack_store = None
+if os.path.isfile(os.path.join(web_pack_dir, PACK_INDEX)):
+    pack_store = PackStore(web_pack_dir)
+
+#------------------------------------------------------------------------------
+def image_time(img_path):
+    """ Return epoch time of an image file or packed image. None if not found """
+    if os.path.isfile(img_path):
+        return os.path.getmtime(img_path)
+    if (pack_store is not None and
+            os.path.abspath(os.path.dirname(img_path)) ==
+            os.path.abspath(web_pack_dir)):
+        return pack_store.image_time(os.path.basename(img_path))
+    return None
+
 #------------------------------------------------------------------------------
 def make_web_page(up_html, row_data, dn_html):
     YYYYMMDD=row_data[0]
@@ -53,7 +72,9 @@ def make_web_page(up_html, row_data, dn_html):
     W=row_data[8]
     H=row_data[9]
     aspect_ratio = float(W)/int(H)
-    if aspect_ratio < guess_person:
+    if len(row_data) > 12 and row_data[12]:
+        Guess = row_data[12]   # object class from speed-cam.py obj_class_rules
+    elif aspect_ratio < guess_person:
         Guess = "Person Walking"
     elif aspect_ratio < guess_cart:
         Guess = "Person on Bike or Golf Cart"
@@ -109,12 +130,13 @@ def make_web_page(up_html, row_data, dn_html):
     base_filename = os.path.splitext(os.path.basename(img_path))[0]
     web_html_path = os.path.join(web_html_dir, base_filename + '.html')
 
-    if os.path.isfile(img_path):
+    img_time = image_time(img_path)
+    if img_time is not None:
         f = open(web_html_path, "w")
         f.write(pageTemplate)
         f.close()
         # Sync file stat dates of html with jpg file
-        shutil.copystat(img_path, web_html_path)
+        os.utime(web_html_path, (img_time, img_time))
         if verbose:
             print("Saved %s<- %s ->%s" % (dn_html, web_html_path , up_html))
     else:
@@ -128,14 +150,14 @@ def check_row(row_data):
     found = False
     web_html_path = ""
     img_path = row_data[5]
-    if os.path.isfile(img_path):
+    if image_time(img_path) is not None:
         base_filename = os.path.splitext(os.path.basename(img_path))[0]
         web_html_path = base_filename+'.html'
         found = True
     return found, web_html_path
 
 #------------------------------------------------------------------------------
-def read_from_csv(filename):
+def read_from_csv(filenames):
     this_is_first_row = True
     this_is_third_row = True
     cur_link = ""
@@ -146,13 +168,11 @@ def read_from_csv(filename):
     cur_row  = []
     prev_row = []
 
-    f = open(filename, 'rt')
     cnt=0
     workStart = time.time()
     workCount = 0
     try:
-        reader = csv.reader(f)
-        for row in reader:
+        for row in csv_rows(filenames):
             workCount += 1
             if not next_row:
                 jpg_exists, next_link = check_row(row)
@@ -190,7 +210,6 @@ def read_from_csv(filename):
         make_web_page(cur_link, next_row, next_link)
 
     finally:
-        f.close()
         workEnd = time.time()
         outDir = os.path.abspath(web_html_dir)
         print("-----------------")
@@ -198,4 +217,10 @@ def read_from_csv(filename):
         print("Processed %i web pages in %i seconds into Folder %s" %
               (workCount, workEnd - workStart, outDir))
         print("Done ...")
-read_from_csv(source_csv)
+from_date = 0
+if html_days > 0:
+    from_date = int((datetime.date.today() -
+                     datetime.timedelta(days=html_days)).strftime("%Y%m%d"))
+read_from_csv(csv_segments(source_csv, from_date))
+if pack_store is not None:
+    pack_store.close()
@@ -578,7 +578,7 @@ function do_report_menu ()
       b\ *) clear
             sqlite3 data/speed_cam.db \
               -header -column \
-              "select idx, log_hour, ave_speed, speed_units,image_path,direction \
+              "select datetime(log_ts/1000000,'unixepoch','localtime') as log_time, ave_speed, speed_units,image_path,direction \
               from speed \
               where ave_speed > 17"  | more -d
             echo ""
@@ -45,7 +45,7 @@ progName = os.path.basename(__file__)  # Get name of this script with no path
 print("%s %s Loading  Please Wait ....." % (progName, ver))
 import time
 import cv2
-import csv
+from speed_csv import csv_segments, csv_rows
 import glob
 import shutil
 import sys
@@ -137,9 +137,8 @@ def search_for_match(search_image, search_rect):
     work_start = time.time()      # Start a timer for processing duration
     try:
         if search_using_csv:
-            f = open(search_csv_path, 'rt')  # Open csv file for reading
-            reader = csv.reader(f)    # Read csv file into reader list
-            image_data = list(reader)
+            # Read rotated csv files listed in the manifest then the current one
+            image_data = list(csv_rows(csv_segments(search_csv_path)))
         else:
             image_data = glob.glob(os.path.join(search_source_image_path, '/*jpg'))
         search_images_total = len(image_data)
@@ -187,8 +186,6 @@ def search_for_match(search_image, search_rect):
         except OSError as err:
             print('ERROR: Copy Failed from %s to %s - %s' % (search_file, results_dir_path, err))
     finally:
-        if search_using_csv:
-            f.close()   # close csv file
         work_end = time.time()  # stop work timer
         print("------------------------------------------------")
         print("Search Results Matching %s" % search_image)
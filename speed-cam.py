@@ -47,8 +47,13 @@ import glob
 import shutil
 import logging
 import sqlite3
-from threading import Thread
+from threading import Thread, Event, Lock
+from collections import deque
 import subprocess
+try:
+    import queue
+except ImportError:
+    import Queue as queue   # python2
 
 progVer = "9.09"
 
@@ -57,7 +62,11 @@ progVer = "9.09"
 # Will work on reports and possibly a web query page for speed data.
 DB_DIR = "/home/pi/speed-camera/data"
 DB_NAME = "speed_cam.db"
-DB_TABLE = "speed"
+# speed table schema
+from speed_db import (DB_TABLE, CONFIG_INSERT, SPEED_INSERT, CLIP_UPDATE,
+                      config_hash, migrate_db)
+from speed_csv import CsvLogger
+from speed_pack import PackStore
 
 if not os.path.exists(DB_DIR):
     os.makedirs(DB_DIR)
@@ -211,6 +220,16 @@ except ImportError:
         logging.error("Try RPI Install per command")
         logging.error("%s %s Exiting Due to Error", progName, progVer)
     sys.exit(1)
+import numpy as np  # Installed as an opencv dependency
+from speed_calibrate import (LinearCalibration, LutCalibration,
+                             homography_from_points, homography_lut,
+                             lane_calibration, AutoCalibrator,
+                             track_object_width)
+from speed_tracker import (Tracker, blob_stream_write, make_trigger,
+                           pack_track_points, check_class_rules,
+                           EVENT_NEW, EVENT_ADD, EVENT_OUT_MIN,
+                           EVENT_OUT_DIR, EVENT_RESET, EVENT_END,
+                           EVENT_REJECT)
 
 # fix possible invalid values
 if WINDOW_BIGGER < 1.0:
@@ -235,9 +254,11 @@ quote = '"'  # Used for creating quote delimited log file of speed data
 if SPEED_MPH:
     speed_units = "mph"
     speed_conv = 0.621371 * px_to_kph
+    mm_sec_conv = 0.621371 * 0.0036   # mm per sec to mph
 else:
     speed_units = "kph"
     speed_conv = px_to_kph
+    mm_sec_conv = 0.0036   # mm per sec to kph
 
 try:
     x_buf_adjust   # check if variable exists in config.py
@@ -272,6 +293,105 @@ except:
     except:
         input("Press Enter to Continue...")  # python 3
 
+# Settings added after config.py ver 9.00. Older config.py files and plugins
+# will not have these so set default values if not found.
+config_new_defaults = (("heatmap_on", False),
+                       ("heatmap_path", "data/speed_heatmap.npy"),
+                       ("heatmap_scale", 4),
+                       ("heatmap_save_sec", 300),
+                       ("track_max_objects", 4),
+                       ("blob_record_path", ""),
+                       ("track_fit_quality", 0.8),
+                       ("track_window_on", True),
+                       ("track_full_scan_frames", 4),
+                       ("track_timeout_zone_only", True),
+                       ("cal_homography_on", False),
+                       ("cal_image_points", []),
+                       ("cal_world_points", []),
+                       ("cal_lanes", []),
+                       ("autocal_on", False),
+                       ("autocal_path", "data/speed_autocal.txt"),
+                       ("autocal_min_tracks", 50),
+                       ("autocal_class", "Vehicle"),
+                       ("track_trigger", "count"),
+                       ("track_len_trig", 70),
+                       ("track_time_trig", 0.5),
+                       ("track_trig_lines", (60, 210)),
+                       ("dup_check_on", True),
+                       ("dup_drop", False),
+                       ("dup_window_sec", 3.0),
+                       ("dup_max_bits", 10),
+                       ("obj_class_rules", []),
+                       ("image_queue_max", 8),
+                       ("db_commit_events", 10),
+                       ("db_commit_ms", 2000),
+                       ("clip_on", False),
+                       ("clip_path", "media/clips"),
+                       ("clip_pre_sec", 3.0),
+                       ("clip_post_sec", 2.0),
+                       ("clip_scale", 0.5),
+                       ("clip_jpeg_quality", 75),
+                       ("clip_max_mb", 32),
+                       ("clip_fourcc", "MJPG"),
+                       ("csv_max_mb", 10),
+                       ("csv_rotate_daily", False),
+                       ("csv_flush_sec", 5.0),
+                       ("image_pack_on", False),
+                       ("image_pack_dir", "media/packs"),
+                       ("image_pack_max_days", 0),
+                       ("image_thumb_width", 160),
+                       ("image_thumb_path", "media/thumbs"),
+                       ("image_save_mode", "full"),
+                       ("image_crop_pad", 24),
+                       ("image_context_scale", 0.5),
+                       ("image_context_path", "media/context"))
+for var_name, var_default in config_new_defaults:
+    if var_name not in globals():
+        logging.info("%s Not Found in config.py Setting value to %s",
+                     var_name, var_default)
+        globals()[var_name] = var_default
+
+# Setup calibration to convert motion blob positions to road distance in mm
+if cal_homography_on:
+    try:
+        cal_homography = homography_from_points(cal_image_points, cal_world_points)
+    except ValueError as err:
+        logging.error("Bad cal_image_points or cal_world_points in config.py - %s", err)
+        logging.error("%s %s Exiting Due to Error", progName, progVer)
+        sys.exit(1)
+    speed_cal = LutCalibration(homography_lut(cal_homography, x_left, x_right,
+                                              y_upper, y_lower))
+else:
+    speed_cal = LinearCalibration(cal_obj_px, cal_obj_mm)
+# Optional per lane calibrations override speed_cal by direction and y band
+try:
+    track_cal = lane_calibration(speed_cal, cal_lanes)
+except ValueError as err:
+    logging.error("Bad cal_lanes in config.py - %s", err)
+    logging.error("%s %s Exiting Due to Error", progName, progVer)
+    sys.exit(1)
+# Setup when a track has enough data to end and log its speed
+try:
+    track_trig = make_trigger(track_trigger, track_counter, track_len_trig,
+                              track_time_trig, track_trig_lines)
+except ValueError as err:
+    logging.error("Bad track_trigger setting in config.py - %s", err)
+    logging.error("%s %s Exiting Due to Error", progName, progVer)
+    sys.exit(1)
+if (track_trig.name == "lines" and
+        (track_trig.line_x1 <= x_buf or
+         track_trig.line_x2 >= (x_right - x_left) - x_buf)):
+    # contours are only tracked between x_buf and crop width - x_buf
+    logging.warn("track_trig_lines %s Must Be Between x_buf %i and %i px"
+                 " or Tracks Can Never Cross Them",
+                 track_trig_lines, x_buf, (x_right - x_left) - x_buf)
+try:
+    check_class_rules(obj_class_rules)
+except ValueError as err:
+    logging.error("Bad obj_class_rules in config.py - %s", err)
+    logging.error("%s %s Exiting Due to Error", progName, progVer)
+    sys.exit(1)
+
 #------------------------------------------------------------------------------
 class PiVideoStream:
     def __init__(self, resolution=(CAMERA_WIDTH, CAMERA_HEIGHT),
@@ -372,6 +492,67 @@ class WebcamVideoStream:
         """ indicate that the thread should be stopped """
         self.stopped = True
 
+#------------------------------------------------------------------------------
+class MotionHeatmap:
+    def __init__(self, path, frame_w, frame_h, scale=heatmap_scale,
+                 save_sec=heatmap_save_sec):
+        """
+        Sum threshold motion images into a low resolution float32
+        full frame heatmap. Each cell is heatmap_scale px square and
+        holds the number of frames that had motion in that cell.
+        Load a previously saved heatmap so counts build up over days.
+        """
+        self.path = path
+        self.scale = max(1, int(scale))
+        self.save_sec = save_sec
+        shape = (frame_h // self.scale, frame_w // self.scale)
+        self.heat = None
+        if os.path.isfile(path):
+            try:
+                heat = np.load(path)
+            except (IOError, ValueError) as err:
+                logging.error("Failed To Load Heatmap %s - %s", path, err)
+            else:
+                if heat.shape == shape:
+                    self.heat = heat.astype(np.float32)
+                    logging.info("Loaded Heatmap %s", path)
+                else:
+                    logging.warn("Heatmap %s Size %s Does Not Match %s. Start New Heatmap",
+                                 path, heat.shape, shape)
+        if self.heat is None:
+            self.heat = np.zeros(shape, dtype=np.float32)
+        # motion threshold image is the crop area so save its heatmap cells
+        self.y1 = y_upper // self.scale
+        self.y2 = max(self.y1 + 1, y_lower // self.scale)
+        self.x1 = x_left // self.scale
+        self.x2 = max(self.x1 + 1, x_right // self.scale)
+        self.save_time = time.time()
+
+    def add(self, threshold_image):
+        """ add a crop area threshold image to the heatmap """
+        small = cv2.resize(threshold_image,
+                           (self.x2 - self.x1, self.y2 - self.y1),
+                           interpolation=cv2.INTER_AREA)
+        self.heat[self.y1:self.y2, self.x1:self.x2] += small * (1.0 / 255)
+        if time.time() - self.save_time > self.save_sec:
+            self.save()
+
+    def save(self):
+        """ write heatmap to a temp file then rename so readers never see a partial file """
+        self.save_time = time.time()
+        heat_dir = os.path.dirname(self.path)
+        if heat_dir and not os.path.isdir(heat_dir):
+            os.makedirs(heat_dir)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self.heat)
+            if os.path.exists(self.path):
+                os.remove(self.path)   # windows rename will not overwrite
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            logging.error("Failed To Save Heatmap %s - %s", self.path, err)
+
 #------------------------------------------------------------------------------
 def get_fps(start_time, frame_count):
     """ Calculate and display frames per second processing """
@@ -385,6 +566,49 @@ def get_fps(start_time, frame_count):
         frame_count += 1
     return start_time, frame_count
 
+#------------------------------------------------------------------------------
+def track_dhash(image, track):
+    """
+    Return a 64 bit difference hash of the track object crop from a full
+    camera stream image. Similar looking objects differ by few bits.
+    """
+    x1 = max(0, x_left + track.x)
+    y1 = max(0, y_upper + track.y)
+    crop = image[y1:y1 + max(1, track.h), x1:x1 + max(1, track.w)]
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+#------------------------------------------------------------------------------
+class DuplicateFilter:
+    def __init__(self, window_sec, max_bits, size=8):
+        """
+        Ring of (end time, direction, dhash, track id) of the last few
+        ended tracks. A track is a duplicate if one going the same way
+        ended less than window_sec ago with dhash within max_bits bits.
+        """
+        self.window_sec = window_sec
+        self.max_bits = max_bits
+        self.recent = deque(maxlen=size)
+
+    def check(self, dhash, direction, end_time, track_id):
+        """
+        Return (track id, hash bits different) of the event this is a
+        duplicate of or (None, None)
+        """
+        match_id, match_bits = None, None
+        for prev_time, prev_dir, prev_hash, prev_id in self.recent:
+            if prev_dir != direction or end_time - prev_time > self.window_sec:
+                continue
+            bits = bin(prev_hash ^ dhash).count("1")
+            if bits <= self.max_bits:
+                match_id, match_bits = prev_id, bits
+                break
+        # Always add so a chain of duplicates keeps matching
+        self.recent.appendleft((end_time, direction, dhash, track_id))
+        return match_id, match_bits
+
 #------------------------------------------------------------------------------
 def show_settings():
     """Initialize and Display program variable settings from config.py"""
@@ -395,6 +619,12 @@ def show_settings():
         os.makedirs(image_path)
     os.chdir(image_path)
     os.chdir(cwd)
+    if image_thumb_width > 0 and not os.path.isdir(image_thumb_path):
+        logging.info("Creating Thumbnail Folder %s", image_thumb_path)
+        os.makedirs(image_thumb_path)
+    if image_save_mode == "crop" and not os.path.isdir(image_context_path):
+        logging.info("Creating Context Image Folder %s", image_context_path)
+        os.makedirs(image_context_path)
     if imageRecentMax > 0:
         if not os.path.isdir(imageRecentDir):
             logging.info("Create Recent Folder %s", imageRecentDir)
@@ -425,20 +655,44 @@ def show_settings():
               % (pluginEnable, pluginName))
         print("Calibration ..... cal_obj_px=%i px  cal_obj_mm=%i mm (longer is faster) speed_conv=%.5f"
               % (cal_obj_px, cal_obj_mm, speed_conv))
+        if cal_homography_on:
+            print("                  cal_homography_on=%s  Road Distance Lookup %.0f to %.0f mm"
+                  " (cal_obj_px, cal_obj_mm Not Used)"
+                  % (cal_homography_on, speed_cal.lut.min(), speed_cal.lut.max()))
+        if autocal_on:
+            print("                  autocal_on=%s  autocal_path=%s  autocal_min_tracks=%i"
+                  " autocal_class=%s"
+                  % (autocal_on, autocal_path, autocal_min_tracks, autocal_class))
+        for lane_cal in [lane[3] for lane in getattr(track_cal, "lanes", [])]:
+            print("                  cal_lanes %s  cal_obj_px=%i px  cal_obj_mm=%i mm"
+                  % (lane_cal.name, lane_cal.cal_obj_px, lane_cal.cal_obj_mm))
         if pluginEnable:
             print("                  (Change Settings in %s)" % pluginPath)
         else:
             print("                  (Change Settings in %s)" % configFilePath)
         print("Logging ......... Log_data_to_CSV=%s  log_filename=%s.csv (CSV format)"
               % (log_data_to_CSV, baseFileName))
+        print("                  csv_max_mb=%s  csv_rotate_daily=%s  csv_flush_sec=%s"
+              % (csv_max_mb, csv_rotate_daily, csv_flush_sec))
         print("                  loggingToFile=%s  logFilePath=%s"
               % (loggingToFile, logFilePath))
         print("                  SQLITE3 DB_PATH=%s  DB_TABLE=%s"
               % (DB_PATH, DB_TABLE))
         print("Speed Trigger ... Log only if max_speed_over > %i %s"
               % (max_speed_over, speed_units))
-        print("                  and track_counter >= %i consecutive motion events"
-              % track_counter)
+        if track_trigger == "distance":
+            print("                  and track_len_trig >= %i px travelled" % track_len_trig)
+        elif track_trigger == "time":
+            print("                  and track_time_trig >= %.2f sec tracked" % track_time_trig)
+        elif track_trigger == "lines":
+            print("                  and track crossed track_trig_lines x=%i and x=%i px"
+                  % tuple(track_trig_lines))
+        else:
+            print("                  and track_counter >= %i consecutive motion events"
+                  % track_counter)
+        if dup_check_on:
+            print("                  Duplicate if same direction within dup_window_sec=%.1f sec"
+                  " and dup_max_bits=%i  dup_drop=%s" % (dup_window_sec, dup_max_bits, dup_drop))
         print("Exclude Events .. If  x_diff_min < %i or x_diff_max > %i px"
               % (x_diff_min, x_diff_max))
         print("                  If  y_upper < %i or y_lower > %i px"
@@ -449,19 +703,38 @@ def show_settings():
               % (max_speed_over, speed_units))
         print("                  If  event_timeout > %.2f seconds Start New Track"
               % (event_timeout))
-        print("                  track_timeout=%.2f sec wait after Track Ends"
+        print("                  track_max_objects=%i objects tracked at the same time"
+              % (track_max_objects))
+        print("                  If  speed fit quality < track_fit_quality=%.2f (0=off)"
+              % (track_fit_quality))
+        print("                  track_window_on=%s  track_full_scan_frames=%i"
+              " (Search near tracked objects only)"
+              % (track_window_on, track_full_scan_frames))
+        print("                  track_timeout=%.2f sec No New Tracks after Track Ends"
               " (avoid retrack of same object)"
               % (track_timeout))
+        print("                  track_timeout_zone_only=%s"
+              " (True= Only Near Last Object Position)"
+              % (track_timeout_zone_only))
         print("Speed Photo ..... Size=%ix%i px  image_bigger=%.1f"
               "  rotation=%i  VFlip=%s  HFlip=%s "
               % (image_width, image_height, image_bigger,
                  CAMERA_ROTATION, CAMERA_VFLIP, CAMERA_HFLIP))
         print("                  image_path=%s  image_Prefix=%s"
               % (image_path, image_prefix))
+        print("                  image_thumb_width=%i px  image_thumb_path=%s"
+              % (image_thumb_width, image_thumb_path))
+        if image_save_mode == "crop":
+            print("                  image_save_mode=crop  image_crop_pad=%i px"
+                  "  image_context_scale=%.2f  image_context_path=%s"
+                  % (image_crop_pad, image_context_scale, image_context_path))
         print("                  image_font_size=%i px high  image_text_bottom=%s"
               % (image_font_size, image_text_bottom))
         print("Motion Settings . Size=%ix%i px  px_to_kph=%f  speed_units=%s"
               % (CAMERA_WIDTH, CAMERA_HEIGHT, px_to_kph, speed_units))
+        print("Heatmap ......... heatmap_on=%s  heatmap_path=%s  heatmap_scale=%i px"
+              "  heatmap_save_sec=%i" % (heatmap_on, heatmap_path,
+                                          heatmap_scale, heatmap_save_sec))
         print("OpenCV Settings . MIN_AREA=%i sq-px  BLUR_SIZE=%i"
               "  THRESHOLD_SENSITIVITY=%i  CIRCLE_SIZE=%i px"
               % (MIN_AREA, BLUR_SIZE, THRESHOLD_SENSITIVITY, CIRCLE_SIZE))
@@ -508,6 +781,17 @@ def take_calibration_image(speed, filename, cal_image):
 
     for i in range(10, image_width - 9, 10):
         cv2.line(cal_image, (i, y_upper - 5), (i, y_upper + 30), hash_color, 1)
+    if cal_homography_on:
+        # Show a green mark every metre along the road at top, middle
+        # and bottom of crop area to check the homography points
+        lut = speed_cal.lut
+        for row in (0, lut.shape[0] // 2, lut.shape[0] - 1):
+            metres = np.floor(lut[row] / 1000.0)
+            for col in np.nonzero(np.diff(metres))[0]:
+                cv2.line(cal_image, (x_left + int(col), y_upper + row - 5),
+                         (x_left + int(col), y_upper + row + 5), cvGreen, 1)
+        for point in cal_image_points:
+            cv2.circle(cal_image, (int(point[0]), int(point[1])), 3, cvGreen, 1)
     # This is motion window
     cal_image = speed_image_add_lines(cal_image, motion_win_color)
     if SPEED_MPH:
@@ -534,6 +818,9 @@ def take_calibration_image(speed, filename, cal_image):
         print("  4 - Edit %s File and Change Values for the Above Variables." %
               configFilePath)
     print("  5 - Do a Speed Test to Confirm/Tune Settings.  You May Need to Repeat.")
+    if cal_homography_on:
+        print("      cal_homography_on=True  Green Marks Show Every 1000 mm Along Road From cal_image_points")
+        print("      If Marks Are Not Evenly Spaced on the Road Adjust cal_image_points and cal_world_points")
     print("  6 - When Calibration is Finished, Set config.py Variable   calibrate = False")
     print("      Then Restart speed-cam.py and monitor activity.")
     print("")
@@ -754,33 +1041,22 @@ def freeDiskSpaceCheck(lastSpaceCheck):
     return lastSpaceCheck
 
 #------------------------------------------------------------------------------
-def get_image_name(path, prefix):
+def get_image_name(path, prefix, rightNow=None):
     """ build image file names by number sequence or date/time Added tenth of second"""
-    rightNow = datetime.datetime.now()
+    if rightNow is None:
+        rightNow = datetime.datetime.now()
     filename = ("%s/%s%04d%02d%02d-%02d%02d%02d%d.jpg" %
                 (path, prefix, rightNow.year, rightNow.month, rightNow.day,
                  rightNow.hour, rightNow.minute, rightNow.second, rightNow.microsecond/100000))
     return filename
 
 #------------------------------------------------------------------------------
-def log_to_csv(data_to_append):
+def log_to_csv(data_to_append, log_time=None):
     """ Store date to a comma separated value file """
-    log_file_path = baseDir + baseFileName + ".csv"
-    if not os.path.exists(log_file_path):
-        open(log_file_path, 'w').close()
-        f = open(log_file_path, 'ab')
-        # header_text = ('"YYYYMMDD","HH","MM","Speed","Unit",
-        #                  "    Speed Photo Path            ",
-        #                  "X","Y","W","H","Area","Direction"' + "\n")
-        # f.write( header_text )
-        f.close()
-        logging.info("Create New Data Log File %s", log_file_path)
-    filecontents = data_to_append + "\n"
-    f = open(log_file_path, 'a+')
-    f.write(filecontents)
-    f.close()
-    logging.info("   CSV - Updated Data  %s", log_file_path)
-    return
+    if csv_logger is None:
+        return
+    csv_logger.write(data_to_append, log_time)
+    logging.info("   CSV - Updated Data  %s", csv_logger.csv_path)
 
 #------------------------------------------------------------------------------
 def isSQLite3(filename):
@@ -794,7 +1070,7 @@ def isSQLite3(filename):
             return False
         with open(filename, 'rb') as fd:
             header = fd.read(100)
-            if header.startswith('SQLite format 3'):
+            if header.startswith(b'SQLite format 3'):
                 logging.info("Success: File is sqlite3 Format %s", filename)
                 return True
             else:
@@ -845,35 +1121,156 @@ def db_open(db_file):
     try:
         db_conn = sqlite3.connect(db_file)
         cursor = db_conn.cursor()
+        # WAL lets reports and webserver.py read while speed-cam.py writes
+        db_conn.execute("pragma journal_mode=WAL")
+        db_conn.execute("pragma synchronous=NORMAL")
     except sqlite3.Error as e:
         logging.error("Failed: sqlite3 Connect to DB %s", db_file)
         logging.error("Error Msg: %s", e)
         return None
 
-    sql_cmd = '''create table if not exists {} (idx text primary key,
-                 log_date text, log_hour text, log_minute text,
-                 camera text,
-                 ave_speed real, speed_units text, image_path text,
-                 image_w integer, image_h integer, image_bigger integer,
-                 direction text, plugin_name text,
-                 cx integer, cy integer,
-                 mw integer, mh integer, m_area integer,
-                 x_left integer, x_right integer,
-                 y_upper integer, y_lower integer,
-                 max_speed_over integer,
-                 min_area integer, track_counter integer,
-                 cal_obj_px integer, cal_obj_mm integer)'''.format(DB_TABLE)
+    # Create or upgrade the speed table to the current schema version
     try:
-        db_conn.execute(sql_cmd)
+        version = migrate_db(db_conn)
     except sqlite3.Error as e:
-        logging.error("Failed: To Create Table %s on sqlite3 DB %s", DB_TABLE, db_file)
+        logging.error("Failed: To Migrate Table %s on sqlite3 DB %s", DB_TABLE, db_file)
         logging.error("Error Msg: %s", e)
         return None
-    else:
-        db_conn.commit()
+    logging.info("sqlite3 DB %s Schema Version %i", db_file, version)
     return db_conn
 
-def speed_get_contours(image, grayimage1):
+#------------------------------------------------------------------------------
+class DbWriter:
+    def __init__(self, db_file, commit_events=db_commit_events,
+                 commit_ms=db_commit_ms):
+        """
+        Write speed data to the sqlite3 database on a background thread.
+        Each event job is a list of (sql, params) statements. Jobs are grouped
+        and committed together every commit_events jobs or commit_ms
+        milliseconds, whichever is first,
+        so there is one fsync per group instead of one per vehicle.
+        """
+        self.db_file = db_file
+        self.commit_events = max(1, commit_events)
+        self.commit_sec = max(0, commit_ms) / 1000.0
+        self.jobs = queue.Queue(maxsize=1000)
+        self.ready = Event()
+        self.db_conn = None
+        self.thread = None
+
+    def start(self):
+        """
+        Start the writer thread. The sqlite3 connection must be made on the
+        thread that uses it. Returns self or None if the database did not open
+        """
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        self.ready.wait()
+        if self.db_conn is None:
+            self.thread.join()
+            self.thread = None
+            return None
+        return self
+
+    def update(self):
+        """ commit groups of queued jobs until a None job is received """
+        self.db_conn = db_open(self.db_file)
+        self.ready.set()
+        if self.db_conn is None:
+            return
+        pending = []
+        group_time = 0.0
+        while True:
+            try:
+                if pending:
+                    job = self.jobs.get(timeout=max(0.0, group_time - time.time()))
+                else:
+                    job = self.jobs.get()
+            except queue.Empty:
+                job = False   # commit_ms has passed
+            if job is None:
+                self.commit(pending)
+                self.db_conn.close()
+                return
+            if job:
+                if not pending:
+                    group_time = time.time() + self.commit_sec
+                pending.append(job)
+            if pending and (job is False or len(pending) >= self.commit_events or
+                            time.time() >= group_time):
+                self.commit(pending)
+                pending = []
+
+    def commit(self, jobs):
+        """
+        write jobs in one transaction. If it fails each job is retried
+        in its own transaction so only the failing events are lost
+        """
+        if not jobs:
+            return
+        try:
+            self.write(jobs)
+        except sqlite3.Error as e:
+            logging.warn("Failed: To Write Group of %i Jobs - %s."
+                         " Retrying One at a Time", len(jobs), e)
+        else:
+            logging.info(" SQL - Committed %i Rows to sqlite3 %s", len(jobs), self.db_file)
+            return
+        saved = 0
+        for job in jobs:
+            try:
+                self.write([job])
+            except sqlite3.Error as e:
+                logging.error("sqlite3 DB %s", self.db_file)
+                logging.error("Failed: To Write Job to TABLE %s %s", DB_TABLE, job)
+                logging.error("Err Msg: %s", e)
+            else:
+                saved += 1
+        logging.info(" SQL - Committed %i of %i Rows to sqlite3 %s",
+                     saved, len(jobs), self.db_file)
+
+    def write(self, jobs):
+        """
+        run job statements using one executemany per sql then commit.
+        Each sql runs in the order it first appears in the jobs.
+        Rolls back and raises sqlite3.Error if any statement fails
+        """
+        sql_cmds = []
+        sql_params = {}
+        for job in jobs:
+            for sql_cmd, params in job:
+                if sql_cmd not in sql_params:
+                    sql_cmds.append(sql_cmd)
+                    sql_params[sql_cmd] = []
+                sql_params[sql_cmd].append(params)
+        try:
+            for sql_cmd in sql_cmds:
+                self.db_conn.executemany(sql_cmd, sql_params[sql_cmd])
+            self.db_conn.commit()
+        except sqlite3.Error:
+            self.db_conn.rollback()
+            raise
+
+    def add(self, *statements):
+        """ queue one event of parameterized (sql, params) statements """
+        self.jobs.put(statements)
+
+    def stop(self):
+        """ commit all queued jobs then stop the thread """
+        if self.thread is None:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+
+#------------------------------------------------------------------------------
+def speed_get_contours(image, grayimage1, window=None):
+    """
+    Return updated grayimage1, motion contours and threshold image.
+    If window is (x1, x2) only those crop area px columns are searched
+    for motion. Contour positions are always crop area coordinates.
+    """
     image_ok = False
     while not image_ok:
         image = vs.read() # Read image data from video steam thread instance
@@ -894,7 +1291,13 @@ def speed_get_contours(image, grayimage1):
     # Convert to gray scale, which is easier
     grayimage2 = cv2.cvtColor(image_crop, cv2.COLOR_BGR2GRAY)
     # Get differences between the two greyed images
-    differenceimage = cv2.absdiff(grayimage1, grayimage2)
+    if window is None:
+        win_x = 0
+        differenceimage = cv2.absdiff(grayimage1, grayimage2)
+    else:
+        win_x, win_x2 = window
+        differenceimage = cv2.absdiff(grayimage1[:, win_x:win_x2],
+                                      grayimage2[:, win_x:win_x2])
     # Blur difference image to enhance motion vectors
     differenceimage = cv2.blur(differenceimage, (BLUR_SIZE, BLUR_SIZE))
     # Get threshold of blurred difference image
@@ -906,15 +1309,17 @@ def speed_get_contours(image, grayimage1):
         # opencv 2 syntax default
         contours, hierarchy = cv2.findContours(thresholdimage,
                                                cv2.RETR_EXTERNAL,
-                                               cv2.CHAIN_APPROX_SIMPLE)
+                                               cv2.CHAIN_APPROX_SIMPLE,
+                                               offset=(win_x, 0))
     except ValueError:
         # opencv 3 syntax
         thresholdimage, contours, hierarchy = cv2.findContours(thresholdimage,
                                                                cv2.RETR_EXTERNAL,
-                                                               cv2.CHAIN_APPROX_SIMPLE)
+                                                               cv2.CHAIN_APPROX_SIMPLE,
+                                                               offset=(win_x, 0))
     # Update grayimage1 to grayimage2 ready for next image2
     grayimage1 = grayimage2
-    return grayimage1, contours
+    return grayimage1, contours, thresholdimage
 
 def speed_image_add_lines(image, color):
     cv2.line(image, (x_left, y_upper),
@@ -952,43 +1357,647 @@ def speed_notify():
 
     logging.info("Begin Motion Tracking .....")
 
+#------------------------------------------------------------------------------
+def speed_get_blobs(contours, window=None):
+    """
+    Return a list of (x, y, w, h, area) for every contour bigger than
+    MIN_AREA that is completely within the crop area x buffer.
+    Contours cut off by a search window edge are skipped.
+    Biggest area is first.
+    """
+    crop_w = x_right - x_left
+    if window is None:
+        win_x1, win_x2 = 0, crop_w
+    else:
+        win_x1, win_x2 = window
+    blobs = []
+    for c in contours:
+        found_area = cv2.contourArea(c)
+        if found_area > MIN_AREA:
+            (x, y, w, h) = cv2.boundingRect(c)
+            # check if object contour is completely within crop area
+            if (x > x_buf and x + w < crop_w - x_buf):
+                if ((x <= win_x1 and win_x1 > 0) or
+                        (x + w >= win_x2 and win_x2 < crop_w)):
+                    continue
+                blobs.append((x, y, w, h, found_area))
+    blobs.sort(key=lambda blob: blob[4], reverse=True)
+    return blobs
+
+#------------------------------------------------------------------------------
+def speed_image_annotate(image, filename, track_box, ave_speed):
+    """
+    Return a resized copy of a speed image with the motion area, object
+    rectangle and speed text drawn per the image_ config.py settings.
+    track_box is the object (x, y, w, h) in crop area px.
+    """
+    (track_x, track_y, track_w, track_h) = track_box
+    # Add motion rectangle to image if required
+    if image_show_motion_area:
+        image = speed_image_add_lines(image, cvRed)
+        # show centre of motion if required
+        if SHOW_CIRCLE:
+            cv2.circle(image,
+                       (track_x + x_left, track_y + y_upper),
+                       CIRCLE_SIZE,
+                       cvGreen, LINE_THICKNESS)
+        else:
+            cv2.rectangle(image,
+                          (int(track_x + x_left),
+                           int(track_y + y_upper)),
+                          (int(track_x + x_left + track_w),
+                           int(track_y + y_upper + track_h)),
+                          cvGreen, LINE_THICKNESS)
+    big_image = cv2.resize(image,
+                           (image_width,
+                            image_height))
+    # Write text on image before saving
+    # if required.
+    if image_text_on:
+        # Calculate position of text on the images
+        if image_text_bottom:
+            text_y = (image_height - 50)  # show text at bottom of image
+        else:
+            text_y = 10  # show text at top of image
+        image_text = ("SPEED %.1f %s - %s"
+                      % (ave_speed,
+                         speed_units,
+                         filename))
+        text_x = int((image_width / 2) -
+                     (len(image_text) *
+                      image_font_size / 3))
+        if text_x < 2:
+            text_x = 2
+        cv2.putText(big_image,
+                    image_text,
+                    (text_x, text_y),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    FONT_SCALE,
+                    (cvWhite), 2)
+    return big_image
+
+#------------------------------------------------------------------------------
+def speed_is_packed(filename):
+    """ Return True if filename is saved in the image pack store """
+    return (pack_store is not None and
+            os.path.normpath(os.path.dirname(filename)) == os.path.normpath(image_pack_dir))
+
+#------------------------------------------------------------------------------
+def speed_thumb_name(filename):
+    """ Return thumbnail path of speed image filename """
+    if speed_is_packed(filename):
+        return os.path.join(image_pack_dir, "thumb-" + os.path.basename(filename))
+    return os.path.join(image_thumb_path, os.path.basename(filename))
+
+#------------------------------------------------------------------------------
+def speed_context_name(filename):
+    """ Return crop mode context image path of speed image filename """
+    if speed_is_packed(filename):
+        return os.path.join(image_pack_dir, "ctx-" + os.path.basename(filename))
+    return os.path.join(image_context_path, os.path.basename(filename))
+
+#------------------------------------------------------------------------------
+def speed_crop_box(image, track_box):
+    """
+    Return (x, y, w, h) camera image px of the crop mode object image.
+    track_box is the object (x, y, w, h) in crop area px
+    """
+    (track_x, track_y, track_w, track_h) = track_box
+    crop_x = max(0, x_left + track_x - image_crop_pad)
+    crop_y = max(0, y_upper + track_y - image_crop_pad)
+    crop_x2 = min(image.shape[1], x_left + track_x + track_w + image_crop_pad)
+    crop_y2 = min(image.shape[0], y_upper + track_y + track_h + image_crop_pad)
+    return crop_x, crop_y, crop_x2 - crop_x, crop_y2 - crop_y
+
+#------------------------------------------------------------------------------
+def speed_file_write(filename, data):
+    """
+    Save encoded image data to filename or the pack store.
+    Files are written to a temp file then renamed so web pages and
+    file syncs never see a partial image
+    """
+    if speed_is_packed(filename):
+        pack_store.put(os.path.basename(filename), data)
+        return
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.rename(tmp_path, filename)
+
+#------------------------------------------------------------------------------
+def speed_image_write(job):
+    """
+    Annotate, encode and save a speed image job of (image, filename,
+    track_box, ave_speed, save_recent, thumb_filename, context_filename).
+    A thumbnail image_thumb_width px wide is saved to thumb_filename from
+    the same image unless thumb_filename is None.
+    If context_filename is set (crop mode) the native resolution object
+    crop is saved without annotation instead, plus an image_context_scale
+    copy of the whole camera image to context_filename.
+    Returns encode and write ms or None if the image could not be saved.
+    """
+    (image, filename, track_box, ave_speed, save_recent,
+     thumb_filename, context_filename) = job
+    start_time = time.time()
+    if context_filename is None:
+        big_image = speed_image_annotate(image, filename, track_box, ave_speed)
+    else:
+        crop_x, crop_y, crop_w, crop_h = speed_crop_box(image, track_box)
+        big_image = image[crop_y:crop_y + crop_h, crop_x:crop_x + crop_w]
+    try:
+        ok, buf = cv2.imencode(image_format, big_image)
+        if not ok:
+            raise IOError("opencv could not encode %s image" % image_format)
+        speed_file_write(filename, buf.tobytes())
+        if context_filename is not None:
+            context = cv2.resize(image, (int(image.shape[1] * image_context_scale),
+                                         int(image.shape[0] * image_context_scale)),
+                                 interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(image_format, context)
+            if not ok:
+                raise IOError("opencv could not encode %s context image" % image_format)
+            speed_file_write(context_filename, buf.tobytes())
+        if thumb_filename is not None:
+            # Small crop mode images are not enlarged
+            thumb_w = min(image_thumb_width, big_image.shape[1])
+            thumb_h = max(1, big_image.shape[0] * thumb_w // big_image.shape[1])
+            thumb = cv2.resize(big_image, (thumb_w, thumb_h),
+                               interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(image_format, thumb)
+            if not ok:
+                raise IOError("opencv could not encode %s thumbnail" % image_format)
+            speed_file_write(thumb_filename, buf.tobytes())
+    except (IOError, OSError, sqlite3.Error) as err:
+        logging.error("Failed To Save Image %s - %s", filename, err)
+        return None
+    if save_recent and not speed_is_packed(filename):
+        saveRecent(imageRecentMax,
+                   imageRecentDir,
+                   filename,
+                   image_prefix)
+    return (time.time() - start_time) * 1000.0
+
+#------------------------------------------------------------------------------
+class ImageWriter:
+    def __init__(self, max_queue=image_queue_max):
+        """
+        Save speed images on a background thread so motion tracking does
+        not miss frames while images are resized, encoded and written to
+        a slow SD card. The job queue is bounded so memory use is too.
+        """
+        self.jobs = queue.Queue(maxsize=max(1, max_queue))
+        self.thread = None
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def start(self):
+        """ start the thread to save queued images """
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def update(self):
+        """ save queued images until a None job is received """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            self.write(job)
+
+    def write(self, job):
+        """ save one image job and log encode latency and queue depth """
+        write_ms = speed_image_write(job)
+        if write_ms is None:
+            return
+        self.count += 1
+        self.total_ms += write_ms
+        self.max_ms = max(self.max_ms, write_ms)
+        logging.info(" Saved %s  %.0f ms  Image Queue %i/%i",
+                     job[1], write_ms, self.jobs.qsize(), self.jobs.maxsize)
+
+    def put(self, job):
+        """ queue an image job or save it now if the queue is full """
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            logging.warn("Image Queue Full %i Jobs. Saving %s Now",
+                         self.jobs.maxsize, job[1])
+            self.write(job)
+
+    def stop(self):
+        """ save all queued images then stop the thread """
+        if self.thread is None:
+            return
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.count:
+            logging.info("Image Writer Saved %i Images  Ave %.0f ms  Max %.0f ms",
+                         self.count, self.total_ms / self.count, self.max_ms)
+
+#------------------------------------------------------------------------------
+class ClipRecorder:
+    def __init__(self, clip_dir=clip_path, pre_sec=clip_pre_sec,
+                 post_sec=clip_post_sec, max_mb=clip_max_mb,
+                 scale=clip_scale, quality=clip_jpeg_quality,
+                 fourcc=clip_fourcc):
+        """
+        Keep a ring of the last pre_sec + post_sec seconds of downscaled
+        JPEG frames and save a video clip from pre_sec before to post_sec
+        after each speed event. Frames are encoded on one background thread
+        and clips written on another so saving a clip does not stop the
+        ring filling. Ring memory and the frames of clips waiting to be
+        written are each limited to max_mb. Frames and clips are dropped
+        rather than blocking motion tracking if a thread is busy.
+        """
+        self.clip_dir = clip_dir
+        self.pre_sec = max(0.0, pre_sec)
+        self.post_sec = max(0.0, post_sec)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.scale = scale
+        self.quality = int(quality)
+        self.fourcc = fourcc
+        if fourcc.lower() == "mjpg":
+            self.ext = ".avi"
+        else:
+            self.ext = ".mp4"
+        self.frames = queue.Queue(maxsize=8)
+        self.ring = deque()   # (timestamp, jpeg buffer)
+        self.ring_bytes = 0
+        self.pending = []   # (clip filename, event timestamp, db_writer, log_ts)
+        self.clips = queue.Queue()   # pending entries with their ring frames
+        self.clip_bytes = 0   # jpeg bytes of queued clips
+        self.lock = Lock()
+        self.dropped = 0
+        self.thread = None
+        self.writer = None
+
+    def start(self):
+        """ start the thread to encode frames and save clips """
+        if not os.path.isdir(self.clip_dir):
+            os.makedirs(self.clip_dir)
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        self.writer = Thread(target=self.write_clips, args=())
+        self.writer.daemon = True
+        self.writer.start()
+        return self
+
+    def clip_name(self, image_filename):
+        """ Return clip file path named after a speed image file """
+        return os.path.join(self.clip_dir,
+                            os.path.splitext(os.path.basename(image_filename))[0]
+                            + self.ext)
+
+    def add(self, image, frame_ts):
+        """ queue a downscaled copy of a camera frame. Never blocks """
+        if self.thread is None:
+            return
+        small = cv2.resize(image, (int(image.shape[1] * self.scale),
+                                   int(image.shape[0] * self.scale)))
+        try:
+            self.frames.put_nowait((frame_ts, small))
+        except queue.Full:
+            self.dropped += 1
+
+    def trigger(self, filename, event_ts, db_writer=None, log_ts=None):
+        """
+        save a clip to filename around event_ts once post_sec has passed.
+        db_writer sets clip_path of the log_ts speed row once it is written
+        """
+        with self.lock:
+            self.pending.append((filename, event_ts, db_writer, log_ts))
+
+    def update(self):
+        """ encode queued frames into the ring until a None frame is received """
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                self.save_pending(None)
+                return
+            frame_ts, small = frame
+            ok, buf = cv2.imencode(".jpg", small,
+                                   [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            if ok:
+                self.ring.append((frame_ts, buf))
+                self.ring_bytes += len(buf)
+            oldest_ts = frame_ts - self.pre_sec - self.post_sec
+            while self.ring and (self.ring_bytes > self.max_bytes or
+                                 self.ring[0][0] < oldest_ts):
+                self.ring_bytes -= len(self.ring.popleft()[1])
+            self.save_pending(frame_ts)
+
+    def save_pending(self, frame_ts):
+        """
+        queue pending clips that end before frame_ts with their ring
+        frames for the clip writer thread. None queues all
+        """
+        with self.lock:
+            ready = [clip for clip in self.pending
+                     if frame_ts is None or clip[1] + self.post_sec <= frame_ts]
+            self.pending = [clip for clip in self.pending if clip not in ready]
+        for filename, event_ts, db_writer, log_ts in ready:
+            frames = [frame for frame in self.ring
+                      if event_ts - self.pre_sec <= frame[0] <= event_ts + self.post_sec]
+            frames_bytes = sum(len(frame[1]) for frame in frames)
+            with self.lock:
+                if self.clip_bytes > 0 and self.clip_bytes + frames_bytes > self.max_bytes:
+                    logging.warning("Clip Writer Busy. Dropped Clip %s", filename)
+                    continue
+                self.clip_bytes += frames_bytes
+            self.clips.put((filename, frames, db_writer, log_ts))
+
+    def write_clips(self):
+        """ write queued clips until a None clip is received """
+        while True:
+            clip = self.clips.get()
+            if clip is None:
+                return
+            filename, frames, db_writer, log_ts = clip
+            if self.write(filename, frames) and db_writer is not None:
+                db_writer.add((CLIP_UPDATE, (filename, log_ts)))
+            with self.lock:
+                self.clip_bytes -= sum(len(frame[1]) for frame in frames)
+
+    def write(self, filename, frames):
+        """
+        write (timestamp, jpeg buffer) frames to a video clip file.
+        Returns True if the clip was saved
+        """
+        start_time = time.time()
+        if len(frames) < 2:
+            logging.warn("No Frames To Save Clip %s", filename)
+            return False
+        fps = (len(frames) - 1) / max(frames[-1][0] - frames[0][0], 0.001)
+        first = cv2.imdecode(frames[0][1], cv2.IMREAD_COLOR)
+        root, ext = os.path.splitext(filename)
+        tmp_path = root + ".tmp" + ext
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                 fps, (first.shape[1], first.shape[0]))
+        if not writer.isOpened():
+            logging.error("Failed To Save Clip %s - opencv can not write %s",
+                          filename, self.fourcc)
+            return False
+        for frame_ts, buf in frames:
+            writer.write(cv2.imdecode(buf, cv2.IMREAD_COLOR))
+        writer.release()
+        try:
+            os.rename(tmp_path, filename)
+        except OSError as err:
+            logging.error("Failed To Save Clip %s - %s", filename, err)
+            return False
+        logging.info(" Saved Clip %s  %i Frames at %.1f fps  %.0f ms",
+                     filename, len(frames), fps, (time.time() - start_time) * 1000.0)
+        return True
+
+    def stop(self):
+        """ save pending clips with the frames so far then stop the thread """
+        if self.thread is None:
+            return
+        self.frames.put(None)
+        self.thread.join()
+        self.thread = None
+        self.clips.put(None)
+        self.writer.join()
+        self.writer = None
+        if self.dropped:
+            logging.info("Clip Recorder Dropped %i Frames While Busy", self.dropped)
+
+#------------------------------------------------------------------------------
+def speed_save_event(image, track, ave_speed, db_writer, lastSpaceCheck,
+                     duplicate=False, obj_class=""):
+    """
+    Save speed photo, sqlite3 and csv data for a completed track.
+    duplicate is saved in the database to flag a repeat of an earlier event.
+    obj_class is the tracker object class from obj_class_rules.
+    Returns updated lastSpaceCheck
+    """
+    global last_log_time
+    track_x, track_y = track.x, track.y
+    track_w, track_h = track.w, track.h
+    travel_direction = track.direction
+    log_epoch = time.time()
+    # Each track gets its own image file name so make sure
+    # two tracks ending in the same tenth of a second do not collide
+    epoch_time = datetime.datetime.fromtimestamp(log_epoch)
+    log_time = epoch_time.replace(microsecond=epoch_time.microsecond // 100000 * 100000)
+    if last_log_time is not None and log_time <= last_log_time:
+        log_time = last_log_time + datetime.timedelta(microseconds=100000)
+    last_log_time = log_time
+    # log_ts is the database time key in microseconds since the epoch.
+    # It is taken from log_time so it is unique like the image file name
+    nudge = log_time - epoch_time
+    log_ts = (int(round(log_epoch * 1000000)) +
+              (nudge.days * 86400 + nudge.seconds) * 1000000 + nudge.microseconds)
+    # Copy image since more than one track can end on the same frame
+    prev_image = image.copy()
+    # Create a calibration image file name
+    # There are no subdirectories to deal with
+    if calibrate:
+        speed_path = image_path
+        filename = get_image_name(speed_path, "calib-", log_time)
+        prev_image = take_calibration_image(ave_speed,
+                                            filename,
+                                            prev_image)
+    elif pack_store is not None:
+        # image is appended to a pack file named image_pack_dir/filename
+        speed_path = image_pack_dir
+        speed_prefix = image_prefix
+        if image_filename_speed:
+            speed_prefix = str(int(round(ave_speed))) + "-" + image_prefix
+        filename = get_image_name(speed_path, speed_prefix, log_time)
+    else:
+        # Check if subdirectories configured
+        # and create as required
+        speed_path = subDirChecks(imageSubDirMaxHours,
+                                  imageSubDirMaxFiles,
+                                  image_path, image_prefix)
+        # Create image file name prefix
+        if image_filename_speed:
+            speed_prefix = (str(int(round(ave_speed)))
+                            + "-" + image_prefix)
+        else:
+            speed_prefix = image_prefix
+        # create image file name path
+        filename = get_image_name(speed_path,
+                                  speed_prefix, log_time)
+    # Annotate and save image in the background if image_queue_max > 0
+    # The database and csv use filename which is the final image path
+    thumb_filename = None
+    if image_thumb_width > 0 and not calibrate:
+        thumb_filename = speed_thumb_name(filename)
+    # crop mode saves the object crop and a small context image. The crop
+    # box is saved in the database so annotations can be drawn when viewed
+    context_filename = None
+    crop_box = (None, None, None, None)
+    if image_save_mode == "crop" and not calibrate:
+        context_filename = speed_context_name(filename)
+        crop_box = speed_crop_box(prev_image, (track_x, track_y, track_w, track_h))
+    image_job = (prev_image, filename,
+                 (track_x, track_y, track_w, track_h), ave_speed,
+                 imageRecentMax > 0 and not calibrate, thumb_filename,
+                 context_filename)
+    # clip_recorder saves the video around the event once post_sec has
+    # passed and then sets clip_path of the speed row
+    if clip_recorder is not None and not calibrate:
+        clip_recorder.trigger(clip_recorder.clip_name(filename), log_epoch,
+                              db_writer, log_ts)
+    if image_writer is not None:
+        image_writer.put(image_job)
+    else:
+        write_ms = speed_image_write(image_job)
+        if write_ms is not None:
+            logging.info(" Saved %s  %.0f ms", filename, write_ms)
+    if db_writer is not None:
+        log_date = int("%04d%02d%02d" %
+                       (log_time.year,
+                        log_time.month,
+                        log_time.day))
+        log_hour = log_time.hour
+        log_minute = log_time.minute
+        m_area = track_w*track_h
+        ave_speed = round(ave_speed, 2)
+        if WEBCAM:
+            camera = "WebCam"
+        else:
+            camera = "PiCam"
+        if pluginEnable:
+            plugin_name = pluginName
+        else:
+            plugin_name = "None"
+        # Store the calibration the track speed was worked out with
+        used_cal = track.cal
+        # Settings are saved once in config_snapshot and referenced by hash
+        config_data = (image_width, image_height, image_bigger,
+                       plugin_name,
+                       x_left, x_right,
+                       y_upper, y_lower,
+                       max_speed_over,
+                       MIN_AREA, track_counter,
+                       getattr(used_cal, "cal_obj_px", cal_obj_px),
+                       getattr(used_cal, "cal_obj_mm", cal_obj_mm),
+                       used_cal.name)
+        config_key = config_hash(config_data)
+        # create the speed data list ready for db insert
+        speed_data = (log_ts,
+                      log_date, log_hour, log_minute,
+                      camera,
+                      ave_speed, speed_units, filename,
+                      travel_direction,
+                      track_x, track_y,
+                      track_w, track_h, m_area,
+                      sqlite3.Binary(pack_track_points(track.points)),
+                      int(duplicate),
+                      obj_class,
+                      None,   # clip_path is set once the clip is written
+                      thumb_filename,
+                      context_filename) + crop_box + (config_key,)
+        # Queue inserts for the sqlite3 database writer thread. The snapshot
+        # insert is ignored if it exists and is queued each time so it is
+        # never lost with a failed commit group
+        db_writer.add((CONFIG_INSERT, (config_key,) + config_data),
+                      (SPEED_INSERT, speed_data))
+    # Format and Save Data to CSV Log File
+    if log_data_to_CSV:
+        log_csv_time = ("%s%04d%02d%02d%s,"
+                        "%s%02d%s,%s%02d%s"
+                        % (quote,
+                           log_time.year,
+                           log_time.month,
+                           log_time.day,
+                           quote,
+                           quote,
+                           log_time.hour,
+                           quote,
+                           quote,
+                           log_time.minute,
+                           quote))
+        log_csv_text = ("%s,%.2f,%s%s%s,%s%s%s,"
+                        "%i,%i,%i,%i,%i,%s%s%s,%s%s%s"
+                        % (log_csv_time,
+                           ave_speed,
+                           quote,
+                           speed_units,
+                           quote,
+                           quote,
+                           filename,
+                           quote,
+                           track_x, track_y,
+                           track_w, track_h,
+                           track_w * track_h,
+                           quote,
+                           travel_direction,
+                           quote,
+                           quote,
+                           obj_class,
+                           quote))
+        log_to_csv(log_csv_text, log_time)
+    # if required check free disk space
+    # and delete older files (jpg)
+    if spaceTimerHrs > 0:
+        lastSpaceCheck = freeDiskSpaceCheck(lastSpaceCheck)
+    # Manage a maximum number of files
+    # and delete oldest if required.
+    if image_max_files > 0 and pack_store is None:
+        deleteOldFiles(image_max_files,
+                       speed_path,
+                       image_prefix)
+        if thumb_filename is not None:
+            deleteOldFiles(image_max_files,
+                           image_thumb_path,
+                           image_prefix)
+        if context_filename is not None:
+            deleteOldFiles(image_max_files,
+                           image_context_path,
+                           image_prefix)
+    return lastSpaceCheck
+
 #------------------------------------------------------------------------------
 def speed_camera():
     """ Main speed camera processing function """
-    ave_speed = 0.0
     # initialize variables
     frame_count = 0
     fps_time = time.time()
-    first_event = True   # Start a New Motion Track
-    event_timer = time.time()
-    start_pos_x = None
-    end_pos_x = None
-    prev_pos_x = None
-    travel_direction = ""
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    # Calculate position of text on the images
-    if image_text_bottom:
-        text_y = (image_height - 50)  # show text at bottom of image
-    else:
-        text_y = 10  # show text at top of image
+    tracker = Tracker(track_counter, x_diff_min, x_diff_max,
+                      event_timeout, mm_sec_conv, track_max_objects,
+                      track_fit_quality, track_timeout,
+                      track_timeout_zone_only, track_cal, track_trig,
+                      obj_class_rules)
     # Initialize prev_image used for taking speed image photo
     lastSpaceCheck = datetime.datetime.now()
-    speed_path = image_path
-    db_conn = db_check(DB_PATH)
-    # check and open sqlite3 db
-    if db_conn is not None:
-        db_conn = db_open(DB_PATH)
-        if db_conn is None:
-            logging.error("Failed: Connect to sqlite3 DB %s", DB_PATH)
-            db_is_open = False
+    global heatmap, image_writer, db_writer, clip_recorder, csv_logger, pack_store
+    # check and open sqlite3 db on its writer thread
+    if db_writer is None:
+        db_conn = db_check(DB_PATH)
+        if db_conn is not None:
+            db_conn.close()
+            db_writer = DbWriter(DB_PATH).start()
+            if db_writer is None:
+                logging.error("Failed: Connect to sqlite3 DB %s", DB_PATH)
+            else:
+                logging.info("sqlite3 DB is Open %s", DB_PATH)
+    blob_record = None
+    if blob_record_path:
+        logging.info("Recording Motion Blobs to %s", blob_record_path)
+        blob_record = open(blob_record_path, 'a')
+    autocal = None
+    if autocal_on:
+        if cal_homography_on:
+            logging.warn("autocal_on Ignored Since cal_homography_on=True")
         else:
-            logging.info("sqlite3 DB is Open %s", DB_PATH)
-            db_cur = db_conn.cursor()  # Set cursor position
-            db_is_open = True
+            logging.info("Auto Calibration Suggestions Will Be Saved to %s", autocal_path)
+            autocal = AutoCalibrator(cal_obj_mm, autocal_min_tracks)
+    # Tracks have no class when obj_class_rules is off
+    autocal_only = autocal_class if obj_class_rules else ""
+    dup_filter = None
+    if dup_check_on:
+        dup_filter = DuplicateFilter(dup_window_sec, dup_max_bits)
     speed_notify()
     # initialize a cropped grayimage1 image
     image2 = vs.read()  # Get image from PiVideoSteam thread instance
-    prev_image = image2  # make a copy of the first image
     try:
         # crop image to motion tracking area only
         image_crop = image2[y_upper:y_lower, x_left:x_right]
@@ -999,365 +2008,180 @@ def speed_camera():
         time.sleep(4)
         return
     grayimage1 = cv2.cvtColor(image_crop, cv2.COLOR_BGR2GRAY)
-    track_count = 0
-    speed_list = []
-    event_timer = time.time()
+    if image_pack_on and pack_store is None:
+        pack_store = PackStore(image_pack_dir, image_pack_max_days).start()
+        logging.info("Speed Images Will Be Saved in Pack Files in %s", image_pack_dir)
+    if image_queue_max > 0 and image_writer is None:
+        image_writer = ImageWriter(image_queue_max).start()
+    if clip_on and clip_recorder is None:
+        clip_recorder = ClipRecorder().start()
+    if log_data_to_CSV and csv_logger is None:
+        csv_logger = CsvLogger(baseDir + baseFileName + ".csv", csv_max_mb,
+                               csv_rotate_daily, csv_flush_sec).start()
+    if heatmap_on and heatmap is None:
+        heatmap = MotionHeatmap(heatmap_path, image2.shape[1], image2.shape[0])
+    crop_w = x_right - x_left
+    # search window margin. Covers x_diff_max gate plus blur spread
+    window_margin = x_diff_max + BLUR_SIZE
+    # blobs are kept x_buf inside the crop area. Autocal also skips
+    # the blur spread inside that in case the object is cut off there
+    autocal_margin = x_buf + BLUR_SIZE
+    scan_count = 0
     still_scanning = True
     while still_scanning:  # process camera thread images and calculate speed
         image2 = vs.read() # Read image data from video steam thread instance
-        grayimage1, contours = speed_get_contours(image2, grayimage1)
-        # if contours found, find the one with biggest area
+        if clip_recorder is not None:
+            clip_recorder.add(image2, time.time())
+        # While tracking, only search around predicted object positions
+        # except for a full crop area scan every track_full_scan_frames
+        window = None
+        scan_count += 1
+        if (track_window_on and track_full_scan_frames > 1 and
+                scan_count % track_full_scan_frames):
+            window = tracker.search_window(time.time(), window_margin)
+            if window is not None:
+                window = (max(0, window[0]), min(crop_w, window[1]))
+                if window[1] - window[0] < 2 or window[1] - window[0] >= crop_w:
+                    window = None
+        grayimage1, contours, thresholdimage = speed_get_contours(image2, grayimage1,
+                                                                  window)
+        if heatmap is not None and window is None:
+            heatmap.add(thresholdimage)
+        cur_track_time = time.time() # record cur track time
+        # get all contours that qualify as moving objects
+        blobs = []
+        total_contours = 0
         if contours:
             total_contours = len(contours)
-            motion_found = False
-            biggest_area = MIN_AREA
-            for c in contours:
-                # get area of contour
-                found_area = cv2.contourArea(c)
-                if found_area > biggest_area:
-                    (x, y, w, h) = cv2.boundingRect(c)
-                    # check if object contour is completely within crop area
-                    if (x > x_buf and x + w < x_right - x_left - x_buf):
-                        cur_track_time = time.time() # record cur track time
-                        track_x = x
-                        track_y = y
-                        track_w = w  # movement width of object contour
-                        track_h = h  # movement height of object contour
-                        motion_found = True
-                        biggest_area = found_area
-            if motion_found:
-                # Check if last motion event timed out
-                reset_time_diff = time.time() - event_timer
-                if  reset_time_diff > event_timeout:
-                    # event_timer exceeded so reset for new track
-                    event_timer = time.time()
-                    first_event = True
-                    start_pos_x = None
-                    prev_pos_x = None
-                    end_pos_x = None
-                    logging.info("Reset- event_timer %.2f>%.2f sec Exceeded",
-                                 reset_time_diff, event_timeout)
-                ##############################
-                # Process motion events and track object movement
-                ##############################
-                if first_event:   # This is a first valid motion event
-                    first_event = False  # Only one first track event
-                    track_start_time = cur_track_time # Record track start time
-                    prev_start_time = cur_track_time
-                    start_pos_x = track_x
-                    prev_pos_x = track_x
-                    end_pos_x = track_x
-                    logging.info("New  - 0/%i xy(%i,%i) Start New Track",
-                                 track_counter, track_x, track_y)
-                    event_timer = time.time() # Reset event timeout
-                    track_count = 0
-                    speed_list = []
-                else:
-                    prev_pos_x = end_pos_x
-                    end_pos_x = track_x
-                    if end_pos_x - prev_pos_x > 0:
-                        travel_direction = "L2R"
-                    else:
-                        travel_direction = "R2L"
-                    # check if movement is within acceptable distance
-                    # range of last event
-                    if (abs(end_pos_x - prev_pos_x) > x_diff_min and
-                            abs(end_pos_x - prev_pos_x) < x_diff_max):
-                        track_count += 1  # increment
-                        cur_track_dist = abs(end_pos_x - prev_pos_x)
-                        cur_ave_speed = float((abs(cur_track_dist /
-                                               float(abs(cur_track_time -
-                                                         prev_start_time)))) *
-                                                         speed_conv)
-                        speed_list.append(cur_ave_speed)
-                        prev_start_time = cur_track_time
-                        event_timer = time.time()
-                        if track_count >= track_counter:
-                            tot_track_dist = abs(track_x - start_pos_x)
-                            tot_track_time = abs(track_start_time - cur_track_time)
-                            # ave_speed = float((abs(tot_track_dist / tot_track_time)) * speed_conv)
-                            ave_speed = sum(speed_list) / float(len(speed_list))
-                            # Track length exceeded so take process speed photo
-                            if ave_speed > max_speed_over or calibrate:
-                                logging.info(" Add - %i/%i xy(%i,%i) %3.2f %s"
-                                             " D=%i/%i C=%i %ix%i=%i sqpx %s",
-                                             track_count, track_counter,
-                                             track_x, track_y,
-                                             cur_ave_speed, speed_units,
-                                             abs(track_x - prev_pos_x),
-                                             x_diff_max,
-                                             total_contours,
-                                             track_w, track_h, biggest_area,
-                                             travel_direction)
-                                # Resize and process previous image
-                                # before saving to disk
-                                prev_image = image2
-                                # Create a calibration image file name
-                                # There are no subdirectories to deal with
-                                if calibrate:
-                                    log_time = datetime.datetime.now()
-                                    filename = get_image_name(speed_path, "calib-")
-                                    prev_image = take_calibration_image(ave_speed,
-                                                                        filename,
-                                                                        prev_image)
-                                else:
-                                    # Check if subdirectories configured
-                                    # and create as required
-                                    speed_path = subDirChecks(imageSubDirMaxHours,
-                                                              imageSubDirMaxFiles,
-                                                              image_path, image_prefix)
-                                    # Create image file name prefix
-                                    if image_filename_speed:
-                                        speed_prefix = (str(int(round(ave_speed)))
-                                                        + "-" + image_prefix)
-                                    else:
-                                        speed_prefix = image_prefix
-                                    # Record log_time for use later in csv and sqlite
-                                    log_time = datetime.datetime.now()
-                                    # create image file name path
-                                    filename = get_image_name(speed_path,
-                                                              speed_prefix)
-                                # Add motion rectangle to image if required
-                                if image_show_motion_area:
-                                    prev_image = speed_image_add_lines(prev_image, cvRed)
-                                    # show centre of motion if required
-                                    if SHOW_CIRCLE:
-                                        cv2.circle(prev_image,
-                                                   (track_x + x_left, track_y + y_upper),
-                                                   CIRCLE_SIZE,
-                                                   cvGreen, LINE_THICKNESS)
-                                    else:
-                                        cv2.rectangle(prev_image,
-                                                      (int(track_x + x_left),
-                                                       int(track_y + y_upper)),
-                                                      (int(track_x + x_left + track_w),
-                                                       int(track_y + y_upper + track_h)),
-                                                      cvGreen, LINE_THICKNESS)
-                                big_image = cv2.resize(prev_image,
-                                                       (image_width,
-                                                        image_height))
-                                # Write text on image before saving
-                                # if required.
-                                if image_text_on:
-                                    image_text = ("SPEED %.1f %s - %s"
-                                                  % (ave_speed,
-                                                     speed_units,
-                                                     filename))
-                                    text_x = int((image_width / 2) -
-                                                 (len(image_text) *
-                                                  image_font_size / 3))
-                                    if text_x < 2:
-                                        text_x = 2
-                                    cv2.putText(big_image,
-                                                image_text,
-                                                (text_x, text_y),
-                                                font,
-                                                FONT_SCALE,
-                                                (cvWhite), 2)
-                                logging.info(" Saved %s", filename)
-                                # Save resized image
-                                cv2.imwrite(filename, big_image)
-                                # if required check free disk space
-                                # and delete older files (jpg)
-                                if db_is_open:
-                                    log_idx = ("%04d%02d%02d-%02d%02d%02d%d" %
-                                               (log_time.year,
-                                                log_time.month,
-                                                log_time.day,
-                                                log_time.hour,
-                                                log_time.minute,
-                                                log_time.second,
-                                                log_time.microsecond/100000))
-                                    log_date = ("%04d%02d%02d" %
-                                                (log_time.year,
-                                                 log_time.month,
-                                                 log_time.day))
-                                    log_hour = ("%02d" % log_time.hour)
-                                    log_minute = ("%02d" % log_time.minute)
-                                    m_area = track_w*track_h
-                                    ave_speed = round(ave_speed, 2)
-                                    if WEBCAM:
-                                        camera = "WebCam"
-                                    else:
-                                        camera = "PiCam"
-                                    if pluginEnable:
-                                        plugin_name = pluginName
-                                    else:
-                                        plugin_name = "None"
-                                    # create the speed data list ready for db insert
-                                    speed_data = (log_idx,
-                                                  log_date, log_hour, log_minute,
-                                                  camera,
-                                                  ave_speed, speed_units, filename,
-                                                  image_width, image_height, image_bigger,
-                                                  travel_direction, plugin_name,
-                                                  track_x, track_y,
-                                                  track_w, track_h, m_area,
-                                                  x_left, x_right,
-                                                  y_upper, y_lower,
-                                                  max_speed_over,
-                                                  MIN_AREA, track_counter,
-                                                  cal_obj_px, cal_obj_mm)
-
-                                    # Insert speed_data into sqlite3 database table
-                                    try:
-                                        sql_cmd = '''insert into {} values {}'''.format(DB_TABLE, speed_data)
-                                        db_conn.execute(sql_cmd)
-                                        db_conn.commit()
-                                    except sqlite3.Error as e:
-                                        logging.error("sqlite3 DB %s", DB_PATH)
-                                        logging.error("Failed: To INSERT Speed Data into TABLE %s", DB_TABLE)
-                                        logging.error("Err Msg: %s", e)
-                                    else:
-                                        logging.info(" SQL - Update sqlite3 Data in %s", DB_PATH)
-                                # Format and Save Data to CSV Log File
-                                if log_data_to_CSV:
-                                    log_csv_time = ("%s%04d%02d%02d%s,"
-                                                    "%s%02d%s,%s%02d%s"
-                                                    % (quote,
-                                                       log_time.year,
-                                                       log_time.month,
-                                                       log_time.day,
-                                                       quote,
-                                                       quote,
-                                                       log_time.hour,
-                                                       quote,
-                                                       quote,
-                                                       log_time.minute,
-                                                       quote))
-                                    log_csv_text = ("%s,%.2f,%s%s%s,%s%s%s,"
-                                                    "%i,%i,%i,%i,%i,%s%s%s"
-                                                    % (log_csv_time,
-                                                       ave_speed,
-                                                       quote,
-                                                       speed_units,
-                                                       quote,
-                                                       quote,
-                                                       filename,
-                                                       quote,
-                                                       track_x, track_y,
-                                                       track_w, track_h,
-                                                       track_w * track_h,
-                                                       quote,
-                                                       travel_direction,
-                                                       quote))
-                                    log_to_csv(log_csv_text)
-                                if spaceTimerHrs > 0:
-                                    lastSpaceCheck = freeDiskSpaceCheck(lastSpaceCheck)
-                                # Manage a maximum number of files
-                                # and delete oldest if required.
-                                if image_max_files > 0:
-                                    deleteOldFiles(image_max_files,
-                                                   speed_path,
-                                                   image_prefix)
-                                # Save most recent files
-                                # to a recent folder if required
-                                if imageRecentMax > 0 and not calibrate:
-                                    saveRecent(imageRecentMax,
-                                               imageRecentDir,
-                                               filename,
-                                               image_prefix)
-
-                                logging.info("End  - Ave Speed %.1f %s Tracked %i px in %.3f sec Calib %ipx %imm",
-                                             ave_speed, speed_units,
-                                             tot_track_dist,
-                                             tot_track_time,
-                                             cal_obj_px,
-                                             cal_obj_mm)
-                                print(horz_line)
-                                # Wait to avoid dual tracking same object.
-                                if track_timeout > 0:
-                                    logging.info("Sleep - %0.2f seconds to Clear Track"
-                                                 % track_timeout)
-                                event_timer = time.time()
-                                time.sleep(track_timeout)
-                            else:
-                                logging.info("End  - Skip Photo SPEED %.1f %s"
-                                             " max_speed_over=%i  %i px in %.3f sec"
-                                             " C=%i A=%i sqpx",
-                                             ave_speed, speed_units,
-                                             max_speed_over, tot_track_dist,
-                                             tot_track_time, total_contours,
-                                             biggest_area)
-                                # Optional Wait to avoid dual tracking
-                                if track_timeout > 0:
-                                    logging.info("Sleep - %0.2f seconds to Clear Track"
-                                                 % track_timeout)
-                                event_timer = time.time()
-                                time.sleep(track_timeout)
-                            # Track Ended so Reset Variables ready for
-                            # next tracking sequence
-                            start_pos_x = None
-                            end_pos_x = None
-                            first_event = True # Reset Track
-                            track_count = 0
-                            event_timer = time.time()
-                        else:
-                            logging.info(" Add - %i/%i xy(%i,%i) %3.2f %s"
-                                         " D=%i/%i C=%i %ix%i=%i sqpx %s",
-                                         track_count, track_counter,
-                                         track_x, track_y,
-                                         cur_ave_speed, speed_units,
-                                         abs(track_x - prev_pos_x),
-                                         x_diff_max,
-                                         total_contours,
-                                         track_w, track_h, biggest_area,
-                                         travel_direction)
-                            end_pos_x = track_x
-                            # valid motion found so update event_timer
-                            event_timer = time.time()
-                    # Movement was not within range parameters
-                    else:
-                        if show_out_range:
-                            # movements exceeds Max px movement
-                            # allowed so Ignore and do not update event_timer
-                            if abs(track_x - prev_pos_x) >= x_diff_max:
-                                logging.info(" Out - %i/%i xy(%i,%i) Max D=%i>=%ipx"
-                                             " C=%i %ix%i=%i sqpx %s",
-                                             track_count, track_counter,
-                                             track_x, track_y,
-                                             abs(track_x - prev_pos_x),
-                                             x_diff_max,
-                                             total_contours,
-                                             track_w, track_h, biggest_area,
-                                             travel_direction)
-                                # if track_count is over half way then do not start new track
-                                if track_count > track_counter / 2:
-                                    pass
-                                else:
-                                    first_event = True    # Too Far Away so restart Track
-                            # Did not move much so update event_timer
-                            # and wait for next valid movement.
-                            else:
-                                logging.info(" Out - %i/%i xy(%i,%i) Min D=%i<=%ipx"
-                                             " C=%i %ix%i=%i sqpx %s",
-                                             track_count, track_counter,
-                                             track_x, track_y,
-                                             abs(track_x - end_pos_x),
-                                             x_diff_min,
-                                             total_contours,
-                                             track_w, track_h, biggest_area,
-                                             travel_direction)
-                                # Restart Track if first event otherwise continue
-                                if track_count == 0:
-                                    first_event = True
-                        event_timer = time.time()  # Reset Event Timer
-                if gui_window_on:
-                    # show small circle at contour xy if required
-                    # otherwise a rectangle around most recent contour
-                    if SHOW_CIRCLE:
-                        cv2.circle(image2,
-                                   (track_x + x_left * WINDOW_BIGGER,
-                                    track_y + y_upper * WINDOW_BIGGER),
-                                   CIRCLE_SIZE, cvGreen, LINE_THICKNESS)
+            blobs = speed_get_blobs(contours, window)
+        if blob_record is not None:
+            blob_stream_write(blob_record, cur_track_time, blobs)
+        ##############################
+        # Process motion events and track object movement
+        ##############################
+        for event in tracker.update(blobs, cur_track_time):
+            track = event.track
+            if event.kind == EVENT_NEW:
+                logging.info("New  - T%i 0/%i xy(%i,%i) Start New Track",
+                             track.id, track_counter, track.x, track.y)
+            elif event.kind == EVENT_RESET:
+                logging.info("Reset- T%i event_timer %.2f>%.2f sec Exceeded",
+                             track.id, cur_track_time - track.event_time,
+                             event_timeout)
+            elif event.kind == EVENT_OUT_MIN:
+                if show_out_range:
+                    logging.info(" Out - T%i %i/%i xy(%i,%i) Min D=%i<=%ipx"
+                                 " C=%i %s",
+                                 track.id, track.track_count, track_counter,
+                                 track.x, track.y,
+                                 abs(event.x_diff), x_diff_min,
+                                 total_contours, event.direction)
+            elif event.kind == EVENT_OUT_DIR:
+                if show_out_range:
+                    logging.info(" Out - T%i %i/%i xy(%i,%i) Dir %s Not %s C=%i",
+                                 track.id, track.track_count, track_counter,
+                                 track.x, track.y,
+                                 event.direction, track.direction,
+                                 total_contours)
+            elif event.kind == EVENT_ADD:
+                logging.info(" Add - T%i %i/%i xy(%i,%i) %3.2f %s"
+                             " D=%i/%i C=%i %ix%i=%i sqpx %s",
+                             track.id, track.track_count, track_counter,
+                             track.x, track.y,
+                             event.speed, speed_units,
+                             abs(event.x_diff),
+                             x_diff_max,
+                             total_contours,
+                             track.w, track.h, track.area,
+                             event.direction)
+            elif event.kind == EVENT_END:
+                # Track length exceeded so process speed photo
+                ave_speed = event.speed
+                # Objects near the crop area edge may be cut off so only
+                # vehicles well inside the tracking area are used
+                obj_width = None
+                if (autocal is not None and
+                        (not autocal_only or event.obj_class == autocal_only) and
+                        track.x > autocal_margin and
+                        track.x + track.w < crop_w - autocal_margin):
+                    obj_width = track_object_width(track.points, BLUR_SIZE)
+                if (obj_width is not None and obj_width > 0 and
+                        autocal.add(obj_width, event.direction) % 10 == 0):
+                    try:
+                        result = autocal.write(autocal_path)
+                    except (IOError, OSError) as err:
+                        logging.error("Failed To Save Auto Calibration %s - %s",
+                                      autocal_path, err)
                     else:
-                        cv2.rectangle(image2,
-                                      (int(x_left + track_x),
-                                       int(y_upper + track_y)),
-                                      (int(x_left + track_x + track_w),
-                                       int(y_upper + track_y + track_h)),
-                                      cvGreen, LINE_THICKNESS)
+                        if result is not None:
+                            logging.info("Auto Calibration cal_obj_px=%i for cal_obj_mm=%i"
+                                         " from %i Tracks Saved to %s",
+                                         result["cal_obj_px"], cal_obj_mm,
+                                         result["tracks"], autocal_path)
+                # Only events that will be saved go in the duplicate ring
+                # so a skipped slow track can not hide the next real one
+                dup_of, dup_bits = None, None
+                if (dup_filter is not None and not calibrate and
+                        ave_speed > max_speed_over):
+                    dup_of, dup_bits = dup_filter.check(track_dhash(image2, track),
+                                                        event.direction,
+                                                        cur_track_time, track.id)
+                if dup_of is not None and dup_drop:
+                    logging.info("End  - T%i Drop Duplicate of T%i SPEED %.1f %s"
+                                 " Hash %i/%i bits Within dup_window_sec=%.1f",
+                                 track.id, dup_of, ave_speed, speed_units,
+                                 dup_bits, dup_max_bits, dup_window_sec)
+                elif ave_speed > max_speed_over or calibrate:
+                    if dup_of is not None:
+                        logging.info("End  - T%i Flag as Duplicate of T%i Hash %i/%i bits",
+                                     track.id, dup_of, dup_bits, dup_max_bits)
+                    lastSpaceCheck = speed_save_event(image2, track, ave_speed,
+                                                      db_writer, lastSpaceCheck,
+                                                      dup_of is not None,
+                                                      event.obj_class)
+                    logging.info("End  - T%i %s Ave Speed %.1f %s Tracked %i px in %.3f sec"
+                                 " Fit %.2f Calib %s",
+                                 track.id, event.obj_class, ave_speed, speed_units,
+                                 event.track_dist(),
+                                 event.track_time(),
+                                 event.quality,
+                                 track.cal.name)
+                    print(horz_line)
+                else:
+                    logging.info("End  - T%i Skip Photo SPEED %.1f %s"
+                                 " max_speed_over=%i  %i px in %.3f sec"
+                                 " C=%i A=%i sqpx",
+                                 track.id, ave_speed, speed_units,
+                                 max_speed_over, event.track_dist(),
+                                 event.track_time(), total_contours,
+                                 track.area)
+            elif event.kind == EVENT_REJECT:
+                logging.info("End  - T%i Reject SPEED %.1f %s Fit %.2f<%.2f"
+                             "  %i px in %.3f sec",
+                             track.id, event.speed, speed_units,
+                             event.quality, track_fit_quality,
+                             event.track_dist(), event.track_time())
+            if event.kind in (EVENT_END, EVENT_REJECT) and track_timeout > 0:
+                # tracker suppresses new tracks to avoid dual tracking
+                logging.info("Cool - T%i No New Tracks for %0.2f seconds%s",
+                             track.id, track_timeout,
+                             " Near Last Object" if track_timeout_zone_only else "")
         if gui_window_on:
+            # show small circle at contour xy if required
+            # otherwise a rectangle around each tracked contour
+            for track in tracker.tracks:
+                if SHOW_CIRCLE:
+                    cv2.circle(image2,
+                               (int(track.x + x_left * WINDOW_BIGGER),
+                                int(track.y + y_upper * WINDOW_BIGGER)),
+                               CIRCLE_SIZE, cvGreen, LINE_THICKNESS)
+                else:
+                    cv2.rectangle(image2,
+                                  (int(x_left + track.x),
+                                   int(y_upper + track.y)),
+                                  (int(x_left + track.x + track.w),
+                                   int(y_upper + track.y + track.h)),
+                                  cvGreen, LINE_THICKNESS)
             # cv2.imshow('Difference Image',difference image)
             image2 = speed_image_add_lines(image2, cvRed)
             image_view = cv2.resize(image2, (image_width, image_height))
@@ -1365,7 +2189,7 @@ def speed_camera():
             if show_thresh_on:
                 cv2.imshow('Threshold', thresholdimage)
             if show_crop_on:
-                cv2.imshow('Crop Area', image_crop)
+                cv2.imshow('Crop Area', image2[y_upper:y_lower, x_left:x_right])
             # Close Window if q pressed
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 cv2.destroyAllWindows()
@@ -1374,8 +2198,17 @@ def speed_camera():
                 still_scanning = False
         if display_fps:   # Optionally show motion image processing loop fps
             fps_time, frame_count = get_fps(fps_time, frame_count)
+    if blob_record is not None:
+        blob_record.close()
 
 #------------------------------------------------------------------------------
+heatmap = None   # MotionHeatmap instance if heatmap_on=True
+image_writer = None   # ImageWriter instance if image_queue_max > 0
+clip_recorder = None   # ClipRecorder instance if clip_on=True
+csv_logger = None   # CsvLogger instance if log_data_to_CSV=True
+pack_store = None   # PackStore instance if image_pack_on=True
+db_writer = None   # DbWriter instance if sqlite3 database opened
+last_log_time = None   # log_time of last saved speed event
 if __name__ == '__main__':
     show_settings()  # Show variable settings
     try:
@@ -1413,6 +2246,22 @@ if __name__ == '__main__':
             speed_camera() # run main speed camera processing loop
     except KeyboardInterrupt:
         vs.stop()
+        if image_writer is not None:
+            logging.info("Saving Queued Speed Images ...")
+            image_writer.stop()
+        if clip_recorder is not None:
+            logging.info("Saving Pending Video Clips ...")
+            clip_recorder.stop()
+        if pack_store is not None:
+            pack_store.close()
+        if db_writer is not None:
+            logging.info("Saving Queued Database Rows ...")
+            db_writer.stop()
+        if csv_logger is not None:
+            csv_logger.stop()
+        if heatmap is not None:
+            heatmap.save()
+            logging.info("Saved Heatmap %s", heatmap_path)
         print("")
         logging.info("User Pressed Keyboard ctrl-c")
         logging.info("%s %s Exiting Program", progName, progVer)
@@ -31,12 +31,12 @@ if $is_upgrade ; then
     echo "Note: config.py will not be overwritten. Updated settings are in config.py.new"
     speedFiles=("menubox.sh" "speed-cam.py" \
 "speed-cam.sh" "search-speed.py" "search_config.py" "Readme.md" "makehtml.py" "webserver.py" \
-"webserver.sh" "sql_speed_gt.py" )
+"webserver.sh" "sql_speed_gt.py" "heatmap-roi.py" "speed_tracker.py" "speed_calibrate.py" "tracker-bench.py" "sql_recalibrate.py" "speed_db.py" "speed_csv.py" "speed_pack.py" )
 else
     speedFiles=("config.py" "menubox.sh" "speed-cam.py" \
 "speed-cam.sh" "search-speed.py" "search_config.py" "Readme.md" "makehtml.py" "webserver.py" \
 "webserver.sh" "rclone-security-sync-recent.sh" "remote-run.sh" "watch-app.sh" \
-"sql_speed_gt.py" )
+"sql_speed_gt.py" "heatmap-roi.py" "speed_tracker.py" "speed_calibrate.py" "tracker-bench.py" "sql_recalibrate.py" "speed_db.py" "speed_csv.py" "speed_pack.py" )
 fi
 
 for fname in "${speedFiles[@]}" ; do
@@ -0,0 +1,261 @@
+"""
+speed_calibrate.py - Speed camera calibration for speed-cam.py
+
+A calibration converts a motion blob (x, y, w, h, area) in crop area px
+coordinates to a distance in mm along the road. Tracks convert each
+blob position once and speed is the change in distance over time.
+
+LinearCalibration uses the cal_obj_px and cal_obj_mm settings so the
+mm per px is the same everywhere in the image. This is only right when
+the camera looks straight across the road.
+
+LutCalibration uses a lookup table of road distance for every crop area
+px built from a homography of four image points with known road (world)
+positions. This allows cameras to be mounted at an angle to the road.
+
+AutoCalibrator collects the widths of tracked vehicles and suggests a
+cal_obj_px for a reference vehicle length cal_obj_mm from the most common
+width, so calibration does not need reading hash marks off an image.
+Frame difference blobs are wider than the object by the px it moved
+between frames and the blur spread, so track_object_width() takes these
+off before a width is added.
+
+LaneCalibration picks a calibration per track by travel direction and
+blob y band, since near and far lane vehicles are at different distances
+from the camera. Every calibration has a resolve(direction, blob) method
+that the tracker calls once per track when its direction is known.
+"""
+from __future__ import division
+import os
+import time
+from collections import deque
+import numpy as np
+
+#------------------------------------------------------------------------------
+class LinearCalibration(object):
+    """ Same mm per px for the whole crop area """
+    __slots__ = ('name', 'cal_obj_px', 'cal_obj_mm', 'mm_per_px')
+
+    def __init__(self, cal_obj_px, cal_obj_mm, name="default"):
+        self.name = name
+        self.cal_obj_px = cal_obj_px
+        self.cal_obj_mm = cal_obj_mm
+        self.mm_per_px = float(cal_obj_mm) / cal_obj_px
+
+    def distance_mm(self, blob):
+        """ Return road distance in mm of blob left edge """
+        return blob[0] * self.mm_per_px
+
+    def resolve(self, direction, blob):
+        """ Return calibration to use for a track. Always self """
+        return self
+
+#------------------------------------------------------------------------------
+class LutCalibration(object):
+    """
+    Road distance lookup table indexed [row, column] by crop area px.
+    The bottom left corner of a blob is used since that is where
+    the object touches the road.
+    """
+    __slots__ = ('name', 'lut', 'max_x', 'max_y')
+
+    def __init__(self, lut, name="homography"):
+        self.name = name
+        self.lut = lut
+        self.max_y = lut.shape[0] - 1
+        self.max_x = lut.shape[1] - 1
+
+    def distance_mm(self, blob):
+        """ Return road distance in mm of blob bottom left corner """
+        x = min(max(int(blob[0]), 0), self.max_x)
+        y = min(max(int(blob[1] + blob[3] - 1), 0), self.max_y)
+        return float(self.lut[y, x])
+
+    def resolve(self, direction, blob):
+        """ Return calibration to use for a track. Always self """
+        return self
+
+#------------------------------------------------------------------------------
+class LaneCalibration(object):
+    """
+    Per lane calibrations. lanes is a list of (direction, y_min, y_max,
+    calibration). direction is "L2R", "R2L" or "" for either and the blob
+    centre y must be y_min <= y < y_max crop area px (y_max 0 for any y).
+    The first matching lane is used otherwise default.
+    """
+    __slots__ = ('name', 'default', 'lanes')
+
+    def __init__(self, default, lanes, name="lanes"):
+        self.name = name
+        self.default = default
+        self.lanes = lanes
+
+    def distance_mm(self, blob):
+        """ Return road distance in mm using default until a lane is resolved """
+        return self.default.distance_mm(blob)
+
+    def resolve(self, direction, blob):
+        """ Return calibration of the first lane matching direction and blob """
+        y_mid = blob[1] + blob[3] // 2
+        for lane_dir, y_min, y_max, cal in self.lanes:
+            if lane_dir and lane_dir != direction:
+                continue
+            if y_max and not y_min <= y_mid < y_max:
+                continue
+            return cal
+        return self.default
+
+#------------------------------------------------------------------------------
+def homography_from_points(image_points, world_points):
+    """
+    Return the 3x3 homography matrix that maps the four image px
+    (x, y) points to their four road (along mm, across mm) points.
+    Raises ValueError if the points do not give a valid homography.
+    """
+    if len(image_points) != 4 or len(world_points) != 4:
+        raise ValueError("Need exactly 4 image points and 4 world points")
+    rows = []
+    rhs = []
+    for (u, v), (wx, wy) in zip(image_points, world_points):
+        rows.append([u, v, 1, 0, 0, 0, -u * wx, -v * wx])
+        rhs.append(wx)
+        rows.append([0, 0, 0, u, v, 1, -u * wy, -v * wy])
+        rhs.append(wy)
+    try:
+        h = np.linalg.solve(np.array(rows, dtype=np.float64),
+                            np.array(rhs, dtype=np.float64))
+    except np.linalg.LinAlgError:
+        raise ValueError("Points are collinear. Pick 4 points that form a quadrilateral")
+    return np.append(h, 1.0).reshape(3, 3)
+
+#------------------------------------------------------------------------------
+def homography_lut(homography, x_left, x_right, y_upper, y_lower):
+    """
+    Return a float32 lookup table of road distance in mm along the road
+    for every px of the crop area. Indexed [row, column] in crop area px.
+    """
+    cols = np.arange(x_left, x_right, dtype=np.float64)
+    rows = np.arange(y_upper, y_lower, dtype=np.float64)
+    u, v = np.meshgrid(cols, rows)
+    h = homography
+    w = h[2, 0] * u + h[2, 1] * v + h[2, 2]
+    along = (h[0, 0] * u + h[0, 1] * v + h[0, 2]) / w
+    return along.astype(np.float32)
+
+#------------------------------------------------------------------------------
+def lane_calibration(default, cal_lanes):
+    """
+    Return a LaneCalibration built from config.py cal_lanes entries of
+    (direction, y_min, y_max, cal_obj_px, cal_obj_mm) or default if empty.
+    Raises ValueError on a bad entry.
+    """
+    if not cal_lanes:
+        return default
+    lanes = []
+    for entry in cal_lanes:
+        try:
+            (direction, y_min, y_max, obj_px, obj_mm) = entry
+        except (TypeError, ValueError):
+            raise ValueError("cal_lanes entry %s is not "
+                             "(direction, y_min, y_max, cal_obj_px, cal_obj_mm)" % (entry,))
+        if direction not in ("", "L2R", "R2L"):
+            raise ValueError("cal_lanes direction %s is not L2R, R2L or empty" % direction)
+        if obj_px <= 0 or obj_mm <= 0:
+            raise ValueError("cal_lanes entry %s cal_obj_px and cal_obj_mm must be > 0" % (entry,))
+        name = "%s y%i-%i" % (direction or "Any", y_min, y_max)
+        lanes.append((direction, y_min, y_max,
+                      LinearCalibration(obj_px, obj_mm, name)))
+    return LaneCalibration(default, lanes)
+
+#------------------------------------------------------------------------------
+def track_object_width(points, blur_px):
+    """
+    Return the object px width of a track from its (frame_id, frame_ts,
+    x, y, w, h) points. The last blob width less the median px moved per
+    frame and blur_px, the blur spread. None if less than two points.
+    """
+    if len(points) < 2:
+        return None
+    x = np.asarray([point[2] for point in points], dtype=np.float32)
+    return points[-1][4] - float(np.median(np.abs(np.diff(x)))) - blur_px
+
+#------------------------------------------------------------------------------
+class AutoCalibrator(object):
+    """
+    Collect tracked object widths in px by direction and estimate the
+    typical passenger car width as the mode of a numpy histogram. The
+    median of the widths in and next to the mode bin is the suggested
+    cal_obj_px for ref_mm, a typical car length in mm. Only the last
+    max_samples widths are kept so the suggestion follows camera changes.
+    """
+    def __init__(self, ref_mm, min_tracks=50, bin_px=2, max_samples=1000):
+        self.ref_mm = ref_mm
+        self.min_tracks = min_tracks
+        self.bin_px = max(1, int(bin_px))
+        self.widths = {"L2R": deque(maxlen=max_samples),
+                       "R2L": deque(maxlen=max_samples)}
+        self.total = 0
+
+    def add(self, width, direction):
+        """ Add the px width of a tracked object. Returns total widths added """
+        self.widths[direction].append(width)
+        self.total += 1
+        return self.total
+
+    def mode_width(self, widths):
+        """ Return (mode px width, number of widths near mode) or (None, 0) """
+        if len(widths) < self.min_tracks:
+            return None, 0
+        w = np.asarray(widths, dtype=np.float32)
+        bins = np.arange(w.min(), w.max() + 2 * self.bin_px, self.bin_px)
+        counts, edges = np.histogram(w, bins=bins)
+        peak = int(np.argmax(counts))
+        # refine with the median of the mode bin and its neighbours
+        near = w[(w >= edges[max(peak - 1, 0)]) & (w < edges[min(peak + 2, len(edges) - 1)])]
+        return float(np.median(near)), len(near)
+
+    def suggest(self):
+        """
+        Return a dict of suggested settings or None if not enough tracks yet.
+        cal_obj_px uses both directions. L2R and R2L values are included
+        for the cal_lanes setting when there are enough tracks each way.
+        """
+        all_widths = list(self.widths["L2R"]) + list(self.widths["R2L"])
+        cal_px, near = self.mode_width(all_widths)
+        if cal_px is None:
+            return None
+        result = {"cal_obj_px": int(round(cal_px)), "cal_obj_mm": self.ref_mm,
+                  "tracks": len(all_widths), "mode_tracks": near}
+        for direction in ("L2R", "R2L"):
+            dir_px = self.mode_width(self.widths[direction])[0]
+            if dir_px is not None:
+                result[direction] = int(round(dir_px))
+        return result
+
+    def write(self, path):
+        """
+        Write suggested config.py calibration settings to path using a
+        temp file and rename. Returns the suggestion dict or None.
+        """
+        result = self.suggest()
+        if result is None:
+            return None
+        lines = ["# speed-cam.py Auto Calibration Suggestion %s"
+                 % time.strftime("%Y-%m-%d %H:%M:%S"),
+                 "# %(mode_tracks)i of %(tracks)i tracked objects near mode width."
+                 " Copy settings below to config.py" % result,
+                 "cal_obj_px = %(cal_obj_px)i" % result,
+                 "cal_obj_mm = %.1f" % result["cal_obj_mm"]]
+        if "L2R" in result and "R2L" in result:
+            lines.append('# cal_lanes = [("L2R", 0, 0, %i, %.1f), ("R2L", 0, 0, %i, %.1f)]'
+                         % (result["L2R"], self.ref_mm, result["R2L"], self.ref_mm))
+        cal_dir = os.path.dirname(path)
+        if cal_dir and not os.path.isdir(cal_dir):
+            os.makedirs(cal_dir)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        if os.path.exists(path):
+            os.remove(path)   # windows rename will not overwrite
+        os.rename(tmp_path, path)
+        return result
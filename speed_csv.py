@@ -0,0 +1,171 @@
+"""
+speed_csv.py - speed event csv log files for speed-cam.py and tools
+
+CsvLogger keeps the csv log file open and line buffered so each event
+line is one write instead of an open, write and close. A timer thread
+syncs the file to disk every flush_sec. The log is rotated by size or
+by day into dated segment files next to it and each closed segment is
+added to a manifest so tools can read only the segments they need.
+
+    speed-cam.csv                  current log. Same name as before
+    speed-cam-20190601.csv         closed segments named by first date
+    speed-cam-20190601-2.csv
+    speed-cam-manifest.csv         segment, first_date, last_date, bytes
+"""
+import csv
+import datetime
+import logging
+import os
+from threading import Thread, Event, Lock
+
+#------------------------------------------------------------------------------
+def manifest_path(csv_path):
+    """ Return manifest file path for csv log file csv_path """
+    return os.path.splitext(csv_path)[0] + "-manifest.csv"
+
+#------------------------------------------------------------------------------
+def csv_segments(csv_path, from_date=0):
+    """
+    Return oldest first list of csv log files with events on or after
+    from_date YYYYMMDD integer. 0 returns all. The current log file is last
+    """
+    segments = []
+    manifest = manifest_path(csv_path)
+    if os.path.isfile(manifest):
+        with open(manifest, 'rt') as f:
+            for row in csv.reader(f):
+                if len(row) < 3 or not row[2].isdigit():
+                    continue   # header or damaged line
+                segment = os.path.join(os.path.dirname(csv_path), row[0])
+                if int(row[2]) >= from_date and os.path.isfile(segment):
+                    segments.append(segment)
+    if os.path.isfile(csv_path):
+        segments.append(csv_path)
+    return segments
+
+#------------------------------------------------------------------------------
+def csv_rows(filenames):
+    """ Yield csv rows of each file in filenames in order """
+    for filename in filenames:
+        with open(filename, 'rt') as f:
+            for row in csv.reader(f):
+                yield row
+
+#------------------------------------------------------------------------------
+def csv_first_date(csv_path):
+    """ Return YYYYMMDD integer of the first line of csv_path or None """
+    try:
+        with open(csv_path, 'rt') as f:
+            row = next(csv.reader(f), None)
+    except IOError:
+        return None
+    if row and row[0].isdigit():
+        return int(row[0])
+    return None
+
+#------------------------------------------------------------------------------
+class CsvLogger:
+    def __init__(self, csv_path, max_mb=10, rotate_daily=False, flush_sec=5.0):
+        """
+        Append event lines to csv_path. The file is rotated when it grows
+        past max_mb (0=off) or, if rotate_daily, when the date changes.
+        """
+        self.csv_path = csv_path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.rotate_daily = rotate_daily
+        self.flush_sec = max(0.1, flush_sec)
+        self.lock = Lock()
+        self.stopped = Event()
+        self.file = None
+        self.first_date = None
+        self.last_date = None
+        self.thread = None
+
+    def start(self):
+        """ open the csv file and start the flush timer thread """
+        self.open()
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def open(self):
+        """ open the csv log file for appending with line buffering """
+        if not os.path.exists(self.csv_path):
+            logging.info("Create New Data Log File %s", self.csv_path)
+        self.file = open(self.csv_path, 'a', 1)
+        self.first_date = csv_first_date(self.csv_path)
+        self.last_date = self.first_date
+
+    def update(self):
+        """ sync the csv file to disk every flush_sec until stopped """
+        while not self.stopped.wait(self.flush_sec):
+            with self.lock:
+                self.sync()
+
+    def sync(self):
+        """ flush and sync the open csv file to disk """
+        if self.file is None:
+            return
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except (IOError, OSError) as err:
+            logging.error("Failed To Sync CSV File %s - %s", self.csv_path, err)
+
+    def write(self, line, log_time=None):
+        """ append one csv line for an event at datetime log_time """
+        if log_time is None:
+            log_time = datetime.datetime.now()
+        log_date = int(log_time.strftime("%Y%m%d"))
+        with self.lock:
+            if self.file is None:
+                return
+            if self.file.tell() > 0 and (
+                    (self.max_bytes > 0 and self.file.tell() >= self.max_bytes) or
+                    (self.rotate_daily and self.last_date is not None and
+                     log_date != self.last_date)):
+                self.rotate()
+            self.file.write(line + "\n")
+            if self.first_date is None:
+                self.first_date = log_date
+            self.last_date = log_date
+
+    def rotate(self):
+        """ close the csv file, rename it to a dated segment and start a new one """
+        self.sync()
+        self.file.close()
+        self.file = None
+        root, ext = os.path.splitext(self.csv_path)
+        first_date = self.first_date or self.last_date
+        segment = "%s-%s%s" % (root, first_date, ext)
+        seq = 1
+        while os.path.exists(segment):
+            seq += 1
+            segment = "%s-%s-%i%s" % (root, first_date, seq, ext)
+        try:
+            os.rename(self.csv_path, segment)
+            manifest = manifest_path(self.csv_path)
+            new_manifest = not os.path.exists(manifest)
+            with open(manifest, 'a') as f:
+                if new_manifest:
+                    f.write("segment,first_date,last_date,bytes\n")
+                f.write("%s,%s,%s,%i\n" % (os.path.basename(segment), first_date,
+                                           self.last_date, os.path.getsize(segment)))
+        except (IOError, OSError) as err:
+            logging.error("Failed To Rotate CSV File %s - %s", self.csv_path, err)
+        else:
+            logging.info("Rotated CSV File to %s", segment)
+        self.open()
+
+    def stop(self):
+        """ stop the flush timer and close the csv file """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            if self.file is not None:
+                self.sync()
+                self.file.close()
+                self.file = None
@@ -0,0 +1,437 @@
+"""
+speed_db.py - sqlite3 speed database schema for speed-cam.py and tools
+
+The schema_version table records which MIGRATIONS have been applied.
+migrate_db runs any newer migrations in order when speed-cam.py opens
+the database so old databases are upgraded without manual sqlite3
+sessions. Migrations check the schema before changing anything so a
+migration interrupted part way can safely run again.
+
+To change the schema add a new migrate_ function to the end of
+MIGRATIONS. Never edit a migration that has been released.
+"""
+import hashlib
+import logging
+import sqlite3
+
+DB_TABLE = "speed"
+# speed table columns written by speed-cam.py in speed_data order.
+# config_id is looked up from the CONFIG_TABLE hash by SPEED_INSERT
+DB_COLUMNS = ("log_ts", "log_date", "log_hour", "log_minute", "camera",
+              "ave_speed", "speed_units", "image_path", "direction",
+              "cx", "cy", "mw", "mh", "m_area",
+              "track_points", "duplicate", "obj_class", "clip_path",
+              "thumb_path", "context_path", "crop_x", "crop_y", "crop_w", "crop_h")
+
+CONFIG_TABLE = "config_snapshot"
+# Settings that only change with config.py, saved once per snapshot.
+# cal_obj_px, cal_obj_mm and cal_name are the calibration a track used
+CONFIG_COLUMNS = ("image_w", "image_h", "image_bigger", "plugin_name",
+                  "x_left", "x_right", "y_upper", "y_lower", "max_speed_over",
+                  "min_area", "track_counter", "cal_obj_px", "cal_obj_mm",
+                  "cal_name")
+
+# Parameters are (config_hash,) + CONFIG_COLUMNS values
+CONFIG_INSERT = ("insert or ignore into {} (hash, {}) values (?, {})".format(
+    CONFIG_TABLE, ", ".join(CONFIG_COLUMNS), ", ".join("?" * len(CONFIG_COLUMNS))))
+# Parameters are DB_COLUMNS values + (config_hash,)
+SPEED_INSERT = ("insert into {0} ({1}, config_id) values ({2},"
+                " (select id from {3} where hash = ?))".format(
+                    DB_TABLE, ", ".join(DB_COLUMNS), ", ".join("?" * len(DB_COLUMNS)),
+                    CONFIG_TABLE))
+# Clips are saved after the speed row so clip_path is set once written.
+# Parameters are (clip_path, log_ts)
+CLIP_UPDATE = "update {} set clip_path = ? where log_ts = ?".format(DB_TABLE)
+
+#------------------------------------------------------------------------------
+def table_columns(conn, table):
+    """ Return list of column names of table. Empty if no table """
+    return [row[1] for row in conn.execute("pragma table_info({})".format(table))]
+
+#------------------------------------------------------------------------------
+def add_columns(conn, table, columns):
+    """ Add (name, type) columns that table does not have yet """
+    existing = table_columns(conn, table)
+    for col_name, col_type in columns:
+        if col_name not in existing:
+            logging.info("Adding %s Column to TABLE %s", col_name, table)
+            conn.execute("alter table {} add column {} {}".format(
+                table, col_name, col_type))
+
+# Rollup tables with the period columns of their key. Each rollup row
+# holds count, sum, sum of squares, min and max of ave_speed for one
+# period, direction, obj_class and ROLLUP_BUCKET wide speed bucket so the
+# rows of a period are also its speed histogram. Triggers on the speed
+# table keep them up to date. Duplicate events are not counted
+ROLLUPS = (("speed_hour", ("log_date", "log_hour")),
+           ("speed_day", ("log_date",)))
+ROLLUP_BUCKET = 5   # speed bucket width in speed_units
+
+#------------------------------------------------------------------------------
+def config_hash(values):
+    """ Return hex hash key of CONFIG_COLUMNS values """
+    text = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)   # 90 and 90.0 are the same setting
+        text.append(repr(value))
+    return hashlib.sha1("|".join(text).encode("utf-8")).hexdigest()
+
+#------------------------------------------------------------------------------
+def config_snapshot_id(conn, values):
+    """ Return id of the config_snapshot row for values, adding it if new """
+    key = config_hash(values)
+    conn.execute(CONFIG_INSERT, (key,) + tuple(values))
+    return conn.execute("select id from {} where hash = ?".format(CONFIG_TABLE),
+                        (key,)).fetchone()[0]
+
+#------------------------------------------------------------------------------
+def speed_view(conn):
+    """ (Re)create speed_view of speed rows joined to their config_snapshot """
+    conn.execute("drop view if exists {}_view".format(DB_TABLE))
+    conn.execute('''create view {0}_view as select s.*, {1}
+                    from {0} s left join {2} c on c.id = s.config_id'''.format(
+                        DB_TABLE, ", ".join("c." + name for name in CONFIG_COLUMNS),
+                        CONFIG_TABLE))
+
+#------------------------------------------------------------------------------
+def migrate_1(conn):
+    """ speed table as created by speed-cam.py 9.0 """
+    conn.execute('''create table if not exists {} (idx text primary key,
+                    log_date text, log_hour text, log_minute text,
+                    camera text,
+                    ave_speed real, speed_units text, image_path text,
+                    image_w integer, image_h integer, image_bigger integer,
+                    direction text, plugin_name text,
+                    cx integer, cy integer,
+                    mw integer, mh integer, m_area integer,
+                    x_left integer, x_right integer,
+                    y_upper integer, y_lower integer,
+                    max_speed_over integer,
+                    min_area integer, track_counter integer,
+                    cal_obj_px integer, cal_obj_mm integer)'''.format(DB_TABLE))
+
+#------------------------------------------------------------------------------
+def migrate_2(conn):
+    """ calibration, track points, duplicate, class and audit columns """
+    add_columns(conn, DB_TABLE, (("cal_name", "text"),
+                                 ("track_points", "blob"),
+                                 ("duplicate", "integer"),
+                                 ("obj_class", "text"),
+                                 ("ave_speed_orig", "real")))
+    conn.execute("create index if not exists {0}_obj_class_idx"
+                 " on {0} (obj_class)".format(DB_TABLE))
+
+#------------------------------------------------------------------------------
+def migrate_3(conn):
+    """ Indexes for report queries by date and hour, speed and direction """
+    # covers sql_speed_gt.py hourly counts so no table rows are read
+    conn.execute("create index if not exists {0}_date_hour_idx"
+                 " on {0} (log_date, log_hour, ave_speed)".format(DB_TABLE))
+    conn.execute("create index if not exists {0}_speed_idx"
+                 " on {0} (ave_speed)".format(DB_TABLE))
+    conn.execute("create index if not exists {0}_direction_idx"
+                 " on {0} (direction, ave_speed)".format(DB_TABLE))
+    conn.execute("analyze {}".format(DB_TABLE))
+
+#------------------------------------------------------------------------------
+def migrate_4(conn):
+    """
+    Rebuild the speed table with an integer rowid primary key and a log_ts
+    integer microsecond epoch column instead of the text idx primary key.
+    log_date, log_hour and log_minute become integers. They are stored and
+    indexed rather than generated since Raspbian sqlite3 is older than 3.31.
+    """
+    columns = conn.execute("pragma table_info({})".format(DB_TABLE)).fetchall()
+    if "log_ts" in [col[1] for col in columns]:
+        return   # already rebuilt
+    # Carry over every other column with its declared type
+    keep = [(col[1], col[2]) for col in columns
+            if col[1] not in ("idx", "log_date", "log_hour", "log_minute")]
+    conn.execute("drop table if exists {}_new".format(DB_TABLE))
+    conn.execute('''create table {}_new (id integer primary key,
+                    log_ts integer not null,
+                    log_date integer, log_hour integer, log_minute integer,
+                    {})'''.format(DB_TABLE, ", ".join("%s %s" % col for col in keep)))
+    # idx is local time YYYYMMDD-HHMMSS plus tenths of a second
+    idx_ts = ("strftime('%s', substr(idx, 1, 4) || '-' || substr(idx, 5, 2) || '-' ||"
+              " substr(idx, 7, 2) || ' ' || substr(idx, 10, 2) || ':' ||"
+              " substr(idx, 12, 2) || ':' || substr(idx, 14, 2), 'utc') * 1000000"
+              " + cast(substr(idx, 16, 1) as integer) * 100000")
+    keep_names = ", ".join(col[0] for col in keep)
+    conn.execute('''insert into {0}_new (log_ts, log_date, log_hour, log_minute, {1})
+                    select {2}, cast(log_date as integer), cast(log_hour as integer),
+                    cast(log_minute as integer), {1} from {0} order by idx'''
+                 .format(DB_TABLE, keep_names, idx_ts))
+    conn.execute("drop table {}".format(DB_TABLE))
+    conn.execute("alter table {0}_new rename to {0}".format(DB_TABLE))
+    # Indexes were dropped with the old table
+    conn.execute("create index {0}_log_ts_idx on {0} (log_ts)".format(DB_TABLE))
+    conn.execute("create index {0}_obj_class_idx on {0} (obj_class)".format(DB_TABLE))
+    conn.execute("create index {0}_date_hour_idx"
+                 " on {0} (log_date, log_hour, ave_speed)".format(DB_TABLE))
+    conn.execute("create index {0}_speed_idx on {0} (ave_speed)".format(DB_TABLE))
+    conn.execute("create index {0}_direction_idx"
+                 " on {0} (direction, ave_speed)".format(DB_TABLE))
+    conn.execute("analyze {}".format(DB_TABLE))
+
+#------------------------------------------------------------------------------
+def migrate_5(conn):
+    """
+    Move the settings in CONFIG_COLUMNS that every speed row repeated to
+    one config_snapshot row per distinct set of values. speed rows keep a
+    config_id. The speed table is rebuilt since sqlite3 before 3.35 can
+    not drop columns. speed_view joins them back for reports.
+    """
+    conn.execute('''create table if not exists {} (id integer primary key,
+                    hash text not null unique,
+                    image_w integer, image_h integer, image_bigger integer,
+                    plugin_name text,
+                    x_left integer, x_right integer,
+                    y_upper integer, y_lower integer,
+                    max_speed_over integer,
+                    min_area integer, track_counter integer,
+                    cal_obj_px real, cal_obj_mm real, cal_name text)'''.format(CONFIG_TABLE))
+    columns = conn.execute("pragma table_info({})".format(DB_TABLE)).fetchall()
+    if "config_id" not in [col[1] for col in columns]:
+        for values in conn.execute("select distinct {} from {}".format(
+                ", ".join(CONFIG_COLUMNS), DB_TABLE)).fetchall():
+            config_snapshot_id(conn, values)
+        keep = [(col[1], col[2]) for col in columns
+                if col[1] not in CONFIG_COLUMNS + ("id", "log_ts")]
+        keep_names = ", ".join(col[0] for col in keep)
+        conn.execute("drop table if exists {}_new".format(DB_TABLE))
+        conn.execute('''create table {}_new (id integer primary key,
+                        log_ts integer not null, {},
+                        config_id integer)'''.format(
+                            DB_TABLE, ", ".join("%s %s" % col for col in keep)))
+        # config_snapshot is small so matching every column is quick
+        match = " and ".join("c.{0} is s.{0}".format(name) for name in CONFIG_COLUMNS)
+        conn.execute('''insert into {0}_new (id, log_ts, {1}, config_id)
+                        select s.id, s.log_ts, {2}, c.id
+                        from {0} s left join {3} c on {4}'''.format(
+                            DB_TABLE, keep_names,
+                            ", ".join("s." + col[0] for col in keep),
+                            CONFIG_TABLE, match))
+        conn.execute("drop table {}".format(DB_TABLE))
+        conn.execute("alter table {0}_new rename to {0}".format(DB_TABLE))
+    for index, index_cols in (("log_ts", "log_ts"),
+                              ("obj_class", "obj_class"),
+                              ("date_hour", "log_date, log_hour, ave_speed"),
+                              ("speed", "ave_speed"),
+                              ("direction", "direction, ave_speed"),
+                              ("config", "config_id")):
+        conn.execute("create index if not exists {0}_{1}_idx on {0} ({2})".format(
+            DB_TABLE, index, index_cols))
+    speed_view(conn)
+    conn.execute("analyze")
+
+#------------------------------------------------------------------------------
+def rollup_keys(row, periods):
+    """ Return rollup key column values sql for row new or old """
+    return ["%s.%s" % (row, period) for period in periods] + [
+        "coalesce(%s.direction, '')" % row,
+        "coalesce(%s.obj_class, '')" % row,
+        "cast(%s.ave_speed / %i as integer) * %i" % (row, ROLLUP_BUCKET, ROLLUP_BUCKET)]
+
+#------------------------------------------------------------------------------
+def rollup_triggers(table, periods):
+    """ Return create trigger sql that keeps rollup table up to date """
+    key_names = list(periods) + ["direction", "obj_class", "speed_bucket"]
+
+    def match(row):
+        return " and ".join("%s = %s" % (name, value)
+                            for name, value in zip(key_names, rollup_keys(row, periods)))
+
+    counted = "{0}.ave_speed is not null and coalesce({0}.duplicate, 0) = 0"
+    add = '''insert or ignore into {0} ({1}, count, speed_sum, speed_sumsq,
+                speed_min, speed_max) values ({2}, 0, 0, 0, new.ave_speed, new.ave_speed);
+            update {0} set count = count + 1, speed_sum = speed_sum + new.ave_speed,
+                speed_sumsq = speed_sumsq + new.ave_speed * new.ave_speed,
+                speed_min = min(speed_min, new.ave_speed),
+                speed_max = max(speed_max, new.ave_speed)
+                where {3};'''.format(table, ", ".join(key_names),
+                                      ", ".join(rollup_keys("new", periods)), match("new"))
+    # min and max can not be taken back so when the removed speed was the
+    # bucket min or max it is looked up from the speed rows left in the
+    # bucket using the rollup_index() index. Other removes leave them as is
+    bucket = rollup_keys("old", periods)[-1]
+    speed_rows = " and ".join(
+        ["{0} = old.{0}".format(period) for period in periods] +
+        ["direction is old.direction", "obj_class is old.obj_class",
+         "ave_speed >= %s" % bucket, "ave_speed < %s + %i" % (bucket, ROLLUP_BUCKET),
+         "(duplicate = 0 or duplicate is null)"])
+    remove = '''update {0} set count = count - 1, speed_sum = speed_sum - old.ave_speed,
+                speed_sumsq = speed_sumsq - old.ave_speed * old.ave_speed,
+                speed_min = case when old.ave_speed <= speed_min
+                    then (select min(ave_speed) from {1} where {2}) else speed_min end,
+                speed_max = case when old.ave_speed >= speed_max
+                    then (select max(ave_speed) from {1} where {2}) else speed_max end
+                where {3};
+            delete from {0} where {3} and count <= 0;'''.format(
+                table, DB_TABLE, speed_rows, match("old"))
+    return (
+        '''create trigger if not exists {0}_insert after insert on {1}
+           when {2} begin {3} end'''.format(table, DB_TABLE, counted.format("new"), add),
+        '''create trigger if not exists {0}_delete after delete on {1}
+           when {2} begin {3} end'''.format(table, DB_TABLE, counted.format("old"), remove),
+        # sql_recalibrate.py changes ave_speed so move the row between buckets
+        '''create trigger if not exists {0}_update_old after update of
+           log_date, log_hour, ave_speed, direction, duplicate, obj_class on {1}
+           when {2} begin {3} end'''.format(table, DB_TABLE, counted.format("old"), remove),
+        '''create trigger if not exists {0}_update_new after update of
+           log_date, log_hour, ave_speed, direction, duplicate, obj_class on {1}
+           when {2} begin {3} end'''.format(table, DB_TABLE, counted.format("new"), add))
+
+#------------------------------------------------------------------------------
+def rollup_index(table, periods):
+    """ Return create index sql for the rollup table min and max lookup """
+    return "create index if not exists {0}_{1}_idx on {0} ({2})".format(
+        DB_TABLE, table, ", ".join(list(periods) +
+                                   ["direction", "obj_class", "ave_speed"]))
+
+#------------------------------------------------------------------------------
+def rollup_rebuild(conn, table, periods):
+    """ Replace all rows of rollup table with one group by of the speed rows """
+    key_names = list(periods) + ["direction", "obj_class", "speed_bucket"]
+    conn.execute("delete from {}".format(table))
+    conn.execute('''insert into {0} ({1}, count, speed_sum, speed_sumsq,
+                    speed_min, speed_max)
+                    select {2}, count(*), sum(ave_speed),
+                    sum(ave_speed * ave_speed), min(ave_speed), max(ave_speed)
+                    from {3} new where {4} group by {5}'''.format(
+                        table, ", ".join(key_names),
+                        ", ".join(rollup_keys("new", periods)), DB_TABLE,
+                        "new.ave_speed is not null and coalesce(new.duplicate, 0) = 0",
+                        ", ".join(str(col + 1) for col in range(len(key_names)))))
+
+#------------------------------------------------------------------------------
+def bulk_update_begin(conn):
+    """
+    Drop the speed table triggers and ave_speed indexes before a bulk
+    ave_speed update so each row update does not maintain them.
+    Returns their create sql for bulk_update_end(). Use both in the
+    same transaction as the update
+    """
+    create_sql = []
+    for obj_type, name, sql in conn.execute(
+            "select type, name, sql from sqlite_master where tbl_name = ?"
+            " and type in ('trigger', 'index') and sql is not null",
+            (DB_TABLE,)).fetchall():
+        if obj_type == "trigger" or "ave_speed" in sql:
+            conn.execute("drop {} {}".format(obj_type, name))
+            create_sql.append(sql)
+    return create_sql
+
+#------------------------------------------------------------------------------
+def bulk_update_end(conn, create_sql):
+    """ Rebuild the rollups then recreate bulk_update_begin() triggers and indexes """
+    for table, periods in ROLLUPS:
+        rollup_rebuild(conn, table, periods)
+    for sql in create_sql:
+        conn.execute(sql)
+
+#------------------------------------------------------------------------------
+def migrate_6(conn):
+    """ Hourly and daily speed rollup tables kept up to date by triggers """
+    for table, periods in ROLLUPS:
+        key_names = list(periods) + ["direction", "obj_class", "speed_bucket"]
+        conn.execute('''create table if not exists {0} ({1},
+                        direction text, obj_class text, speed_bucket integer,
+                        count integer, speed_sum real, speed_sumsq real,
+                        speed_min real, speed_max real,
+                        primary key ({2}))'''.format(
+                            table, ", ".join(period + " integer" for period in periods),
+                            ", ".join(key_names)))
+        # Rebuild from the speed rows in case of an interrupted migration
+        rollup_rebuild(conn, table, periods)
+        for trigger_sql in rollup_triggers(table, periods):
+            conn.execute(trigger_sql)
+    conn.execute("analyze")
+
+#------------------------------------------------------------------------------
+def migrate_7(conn):
+    """ Path of the video clip saved around each speed event """
+    add_columns(conn, DB_TABLE, (("clip_path", "text"),))
+    speed_view(conn)   # select s.* was expanded when the view was created
+
+#------------------------------------------------------------------------------
+def migrate_8(conn):
+    """ Path of the thumbnail saved with each speed image """
+    add_columns(conn, DB_TABLE, (("thumb_path", "text"),))
+    speed_view(conn)
+
+#------------------------------------------------------------------------------
+def migrate_9(conn):
+    """
+    Crop mode context image path and object crop box in camera image px.
+    The object box in camera px is cx + x_left, cy + y_upper, mw, mh
+    """
+    add_columns(conn, DB_TABLE, (("context_path", "text"),
+                                 ("crop_x", "integer"), ("crop_y", "integer"),
+                                 ("crop_w", "integer"), ("crop_h", "integer")))
+    speed_view(conn)
+
+#------------------------------------------------------------------------------
+def migrate_10(conn):
+    """
+    Replace the rollup triggers with ones that only look up min and max
+    when the removed speed was the bucket min or max, and index the lookup
+    """
+    for table, periods in ROLLUPS:
+        for trigger in ("insert", "delete", "update_old", "update_new"):
+            conn.execute("drop trigger if exists {}_{}".format(table, trigger))
+        conn.execute(rollup_index(table, periods))
+        for trigger_sql in rollup_triggers(table, periods):
+            conn.execute(trigger_sql)
+    conn.execute("analyze")
+
+# (version, description, function) in the order they must be applied
+MIGRATIONS = ((1, "Create speed table", migrate_1),
+              (2, "Add calibration, track and class columns", migrate_2),
+              (3, "Add report indexes", migrate_3),
+              (4, "Integer rowid and log_ts microsecond time key", migrate_4),
+              (5, "Move repeated settings to config_snapshot", migrate_5),
+              (6, "Add hourly and daily speed rollups", migrate_6),
+              (7, "Add clip_path column", migrate_7),
+              (8, "Add thumb_path column", migrate_8),
+              (9, "Add crop mode context_path and crop box columns", migrate_9),
+              (10, "Index rollup min and max lookups", migrate_10))
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+#------------------------------------------------------------------------------
+def schema_version(conn):
+    """ Return the schema version of the database. 0 if never migrated """
+    conn.execute('''create table if not exists schema_version
+                    (version integer primary key, description text,
+                     applied text default current_timestamp)''')
+    row = conn.execute("select max(version) from schema_version").fetchone()
+    return row[0] or 0
+
+#------------------------------------------------------------------------------
+def migrate_db(conn):
+    """
+    Apply migrations newer than the database schema version and
+    return the new version. Raises sqlite3.Error if a migration fails
+    and leaves the database at the last successful version.
+    """
+    version = schema_version(conn)
+    conn.commit()
+    if version > SCHEMA_VERSION:
+        logging.warn("Database Schema Version %i is Newer than %i."
+                     " Upgrade speed-cam.py", version, SCHEMA_VERSION)
+        return version
+    for mig_version, description, migrate in MIGRATIONS:
+        if mig_version <= version:
+            continue
+        logging.info("Database Migration %i %s", mig_version, description)
+        try:
+            migrate(conn)
+            conn.execute("insert into schema_version (version, description)"
+                         " values (?, ?)", (mig_version, description))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = mig_version
+    return version
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+speed_pack.py written for speed-cam.py
+Pack file image store. With config.py image_pack_on=True speed images are
+appended to one pack file per day in image_pack_dir instead of being
+saved as millions of small jpg files. The pack_index.db sqlite3 file
+holds the pack, offset and length of each image by file name so an image
+is read with one seek. Index rows are committed in batches after the
+pack file is synced to disk, so a crash can lose the last few index rows
+but never leave one pointing past the end of a pack. Old images are
+deleted by retiring whole packs.
+webserver.py serves packed images by name under /packs/
+
+    ./speed_pack.py                   list packs
+    ./speed_pack.py -x speed-20190601-0712345.jpg   extract an image
+    ./speed_pack.py -r 30             retire packs older than 30 days
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+from threading import RLock, Thread, Event
+
+PACK_INDEX = "pack_index.db"
+PACK_EXT = ".pack"
+
+#------------------------------------------------------------------------------
+class PackStore:
+    def __init__(self, pack_dir, max_days=0, commit_images=20, commit_sec=5.0):
+        """
+        Open the pack index in pack_dir. Packs older than max_days are
+        retired when a new day pack is started. 0 keeps all packs.
+        New index rows are committed every commit_images puts, and by
+        the start() thread commit_sec after a put.
+        Safe to use from more than one thread.
+        """
+        self.pack_dir = pack_dir
+        self.max_days = max_days
+        self.commit_images = max(1, commit_images)
+        self.commit_sec = max(0.1, commit_sec)
+        self.uncommitted = 0
+        self.stopped = Event()
+        self.thread = None
+        if not os.path.isdir(pack_dir):
+            os.makedirs(pack_dir)
+        self.lock = RLock()
+        self.db_conn = sqlite3.connect(os.path.join(pack_dir, PACK_INDEX),
+                                       check_same_thread=False)
+        self.db_conn.execute("pragma journal_mode=WAL")
+        self.db_conn.execute("pragma synchronous=NORMAL")
+        self.db_conn.execute('''create table if not exists pack_image
+                                (name text primary key, pack text not null,
+                                 offset integer, length integer, log_ts integer)''')
+        self.db_conn.execute("create index if not exists pack_image_pack_idx"
+                             " on pack_image (pack)")
+        self.db_conn.commit()
+        self.pack = None
+        self.file = None
+
+    def start(self):
+        """ start the thread that commits index rows every commit_sec """
+        self.thread = Thread(target=self.update, args=())
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def update(self):
+        """ commit index rows every commit_sec until stopped """
+        while not self.stopped.wait(self.commit_sec):
+            self.commit()
+
+    def commit(self):
+        """ sync the open pack file to disk then commit new index rows """
+        with self.lock:
+            if self.uncommitted == 0:
+                return
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+            self.db_conn.commit()
+            self.uncommitted = 0
+
+    def open_pack(self, pack):
+        """ open pack for appending and retire old packs """
+        if self.file is not None:
+            self.commit()   # rows of the old pack before it is closed
+            self.file.close()
+        self.pack = pack
+        self.file = open(os.path.join(self.pack_dir, pack), 'ab')
+        if self.max_days > 0:
+            self.retire_older(self.max_days)
+
+    def put(self, name, data, log_ts=None):
+        """
+        Append encoded image data to today's pack under file name.
+        Returns (pack, offset, length)
+        """
+        if log_ts is None:
+            log_ts = time.time()
+        pack = time.strftime("%Y%m%d", time.localtime(log_ts)) + PACK_EXT
+        with self.lock:
+            if pack != self.pack:
+                self.open_pack(pack)
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(data)
+            self.db_conn.execute("insert or replace into pack_image"
+                                 " (name, pack, offset, length, log_ts)"
+                                 " values (?, ?, ?, ?, ?)",
+                                 (name, pack, offset, len(data),
+                                  int(round(log_ts * 1000000))))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_images:
+                self.commit()
+        return pack, offset, len(data)
+
+    def get(self, name):
+        """ Return the image data saved under file name or None """
+        with self.lock:
+            self.commit()   # pack data must be on disk before it is read
+            row = self.db_conn.execute("select pack, offset, length from pack_image"
+                                       " where name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        pack, offset, length = row
+        try:
+            with open(os.path.join(self.pack_dir, pack), 'rb') as f:
+                f.seek(offset)
+                data = f.read(length)
+        except IOError as err:
+            logging.error("Failed To Read %s from Pack %s - %s", name, pack, err)
+            return None
+        if len(data) != length:
+            return None
+        return data
+
+    def image_time(self, name):
+        """ Return epoch seconds the image under file name was saved or None """
+        with self.lock:
+            row = self.db_conn.execute("select log_ts from pack_image"
+                                       " where name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return row[0] / 1000000.0
+
+    def packs(self):
+        """ Return list of (pack, images, bytes) oldest first """
+        with self.lock:
+            return self.db_conn.execute("select pack, count(*), sum(length)"
+                                        " from pack_image group by pack"
+                                        " order by pack").fetchall()
+
+    def retire(self, pack):
+        """ delete a whole pack file and its images from the index """
+        with self.lock:
+            self.commit()
+            if pack == self.pack:
+                self.file.close()
+                self.file = None
+                self.pack = None
+            self.db_conn.execute("delete from pack_image where pack = ?", (pack,))
+            self.db_conn.commit()
+        try:
+            os.remove(os.path.join(self.pack_dir, pack))
+        except OSError as err:
+            logging.error("Failed To Delete Pack %s - %s", pack, err)
+            return
+        logging.info("Retired Pack %s", pack)
+
+    def retire_older(self, max_days):
+        """ retire packs with images older than max_days """
+        oldest = time.strftime("%Y%m%d", time.localtime(
+            time.time() - max_days * 86400)) + PACK_EXT
+        for old_pack, _, _ in self.packs():
+            if old_pack < oldest:
+                self.retire(old_pack)
+
+    def close(self):
+        """ stop the commit thread, commit and close the pack file and index """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self.commit()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.db_conn.close()
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)-8s %(funcName)-10s %(message)s',
+                        datefmt='%Y-%m-%d %H:%M:%S')
+    extract_dir = os.getcwd()
+    baseDir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(baseDir)
+    sys.path.insert(0, baseDir)
+    import config
+    ap = argparse.ArgumentParser(description="List, extract or retire speed image packs")
+    ap.add_argument("-d", "--pack_dir", default=getattr(config, "image_pack_dir", "media/packs"),
+                    help="pack folder Default=config.py image_pack_dir")
+    ap.add_argument("-x", "--extract", nargs="+", default=[],
+                    help="image file names to extract to the current folder")
+    ap.add_argument("-r", "--retire_days", type=int, default=0,
+                    help="retire packs older than this many days")
+    args = ap.parse_args()
+    if not os.path.isfile(os.path.join(args.pack_dir, PACK_INDEX)):
+        logging.error("No Pack Index Found in %s", args.pack_dir)
+        sys.exit(1)
+    store = PackStore(args.pack_dir)
+    for name in args.extract:
+        image_data = store.get(os.path.basename(name))
+        if image_data is None:
+            logging.error("Image %s Not Found in Packs", name)
+            continue
+        with open(os.path.join(extract_dir, os.path.basename(name)), 'wb') as out:
+            out.write(image_data)
+        logging.info("Extracted %s  %i bytes", os.path.basename(name), len(image_data))
+    if args.retire_days > 0:
+        store.retire_older(args.retire_days)
+    if not args.extract:
+        for pack_name, images, pack_bytes in store.packs():
+            print("%s  %6i Images  %8.1f MB" % (pack_name, images, pack_bytes / 1048576.0))
+    store.close()
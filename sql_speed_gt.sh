@@ -30,31 +30,42 @@ if [ ! -d $report_dir ] ; then
 fi
 
 report_path="$report_dir/$report_filename$speed.txt"
-#  Schema for speed-camera sqlite3 speed table on speed_cam.db database file
+#  Schema version 10 for speed-camera sqlite3 speed table on speed_cam.db database file
 echo ""
 : "
-     idx text primary key,
-     log_date text, log_hour text, log_minute text,
+     id integer primary key, log_ts integer not null,
+     log_date integer, log_hour integer, log_minute integer,
      camera text,
      ave_speed real, speed_units text, image_path text,
-     image_w integer, image_h integer, image_bigger integer,
-     direction text, plugin_name text,
+     direction text,
      cx integer, cy integer,
      mw integer, mh integer, m_area integer,
+     track_points blob, duplicate integer,
+     obj_class text, ave_speed_orig real,
+     config_id integer,
+     clip_path text, thumb_path text, context_path text,
+     crop_x integer, crop_y integer, crop_w integer, crop_h integer
+  Settings saved once per config_snapshot id. speed_view joins both
+     image_w integer, image_h integer, image_bigger integer,
+     plugin_name text,
      x_left integer, x_right integer,
      y_upper integer, y_lower integer,
      max_speed_over integer,
-     min_area integer, track_trig_len integer,
-     cal_obj_px integer, cal_obj_mm integer)
+     min_area integer, track_counter integer,
+     cal_obj_px real, cal_obj_mm real, cal_name text
+  speed_hour and speed_day rollups per period, direction, obj_class, speed_bucket
+     count integer, speed_sum real, speed_sumsq real,
+     speed_min real, speed_max real
 "
 
 echo "sqlite3 Report for speed over $speed" | tee $report_path
 echo "" | tee -a $report_path
 sqlite3 data/speed_cam.db \
   -header -column \
-  "select idx,ave_speed,speed_units,image_path,direction \
+  "select datetime(log_ts/1000000,'unixepoch','localtime') as log_time,ave_speed,speed_units,image_path,direction \
   from speed \
-  where ave_speed > $speed" | tee -a $report_path
+  where ave_speed > $speed \
+  order by log_ts desc" | tee -a $report_path
 echo "" | tee -a $report_path
 echo "Saved sqlite3 Report Query to $report_path" | tee -a $report_path
 
@@ -62,7 +73,7 @@ echo "Saved sqlite3 Report Query to $report_path" | tee -a $report_path
 graph_path="$report_dir/$report_filename$speed.png"
 echo "Generating Graph  Wait ..."
 sqlite3 data/speed_cam.db -column \
-"select log_date, log_hour, count(*) \
+"select log_date, printf('%02d', log_hour), count(*) \
  from speed \
  where ave_speed > $speed \
  group by log_date, log_hour \
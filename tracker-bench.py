@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+tracker-bench.py written for speed-cam.py
+Replay a recorded motion blob stream through the speed_tracker.py
+Tracker to measure tracking speed and check tracking results.
+
+Record a blob stream by setting config.py blob_record_path = "data/blobs.txt"
+and running speed-cam.py for a while. Then run
+
+    ./tracker-bench.py data/blobs.txt
+    ./tracker-bench.py data/blobs.txt -r 20 -v
+    ./tracker-bench.py data/blobs.txt -g all
+    ./tracker-bench.py -w 40 60 90 -g all
+
+Tracker settings are read from config.py and can be overridden by options.
+-g all replays the same stream with each track trigger strategy.
+-w replays a generated stream of objects with these blob px widths driving
+across the crop area both ways, to check every object ends its track.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+import argparse
+
+progVer = "1.00"
+mypath = os.path.abspath(__file__)  # Find the full path of this python script
+baseDir = os.path.dirname(mypath)
+progName = os.path.basename(__file__)
+sys.path.insert(0, baseDir)
+from config import *
+from speed_calibrate import LinearCalibration
+from speed_tracker import (Tracker, blob_stream_read, make_trigger,
+                           EVENT_END, TRIGGERS)
+
+if SPEED_MPH:
+    speed_units = "mph"
+    mm_sec_conv = 0.621371 * 0.0036
+else:
+    speed_units = "kph"
+    mm_sec_conv = 0.0036
+
+ap = argparse.ArgumentParser(description="Replay a blob stream through the speed tracker")
+ap.add_argument("blob_file", nargs="?",
+                help="blob stream file recorded by speed-cam.py")
+ap.add_argument("-w", "--widths", type=int, nargs="+", default=[],
+                help="replay generated objects of these blob px widths instead of blob_file")
+ap.add_argument("-r", "--repeat", type=int, default=10,
+                help="number of times to replay the stream Default=10")
+ap.add_argument("-c", "--track_counter", type=int, default=track_counter)
+ap.add_argument("-e", "--event_timeout", type=float, default=event_timeout)
+ap.add_argument("-t", "--track_timeout", type=float, default=track_timeout)
+ap.add_argument("-q", "--fit_quality", type=float,
+                default=globals().get("track_fit_quality", 0.8))
+ap.add_argument("-g", "--trigger", default=globals().get("track_trigger", "count"),
+                choices=TRIGGERS + ("all",),
+                help="track trigger strategy or all to compare each")
+ap.add_argument("-l", "--track_len_trig", type=int, default=track_len_trig)
+ap.add_argument("-s", "--track_time_trig", type=float,
+                default=globals().get("track_time_trig", 0.5))
+ap.add_argument("-v", "--verbose", action="store_true",
+                help="list each completed track")
+args = ap.parse_args()
+
+#------------------------------------------------------------------------------
+def width_frames(widths, px_step=8, frame_sec=0.05):
+    """
+    Return frames of one object per width driving left to right then
+    right to left across the crop area. Blobs are kept inside x_buf like
+    speed-cam.py does so the stream looks like a recorded one.
+    """
+    crop_w = x_right - x_left
+    x_buf = int(crop_w / globals().get("x_buf_adjust", 10))
+    frames = []
+    frame_ts = 1000.0
+    for w in widths:
+        for step in (px_step, -px_step):
+            if step > 0:
+                x = x_buf + 1
+            else:
+                x = crop_w - x_buf - w - 1
+            while x > x_buf and x + w < crop_w - x_buf:
+                frame_ts += frame_sec
+                frames.append((frame_ts, [(x, 40, w, 30, w * 30)]))
+                x += step
+            frame_ts += args.event_timeout + args.track_timeout + 1.0
+    return frames
+
+#------------------------------------------------------------------------------
+def replay(frames, trigger):
+    """ Run frames through a new Tracker. Return list of events and kind counts """
+    tracker = Tracker(args.track_counter, x_diff_min, x_diff_max,
+                      args.event_timeout, mm_sec_conv,
+                      globals().get("track_max_objects", 4),
+                      args.fit_quality, args.track_timeout,
+                      globals().get("track_timeout_zone_only", True),
+                      LinearCalibration(cal_obj_px, cal_obj_mm), trigger)
+    ends = []
+    counts = {}
+    for frame_ts, blobs in frames:
+        for event in tracker.update(blobs, frame_ts):
+            counts[event.kind] = counts.get(event.kind, 0) + 1
+            if event.kind == EVENT_END:
+                ends.append(event)
+    return ends, counts
+
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if args.widths:
+        frames = width_frames(args.widths)
+        blob_source = "Widths %s px" % " ".join(str(w) for w in args.widths)
+    elif args.blob_file is None:
+        print("ERROR - Need a blob_file or -w widths")
+        sys.exit(1)
+    elif not os.path.isfile(args.blob_file):
+        print("ERROR - Blob Stream File Not Found %s" % args.blob_file)
+        sys.exit(1)
+    else:
+        frames = blob_stream_read(args.blob_file)
+        blob_source = args.blob_file
+    if not frames:
+        print("ERROR - No Frames in %s" % blob_source)
+        sys.exit(1)
+    total_blobs = sum(len(blobs) for frame_ts, blobs in frames)
+    print("%s %s" % (progName, progVer))
+    print("Replay %s  %i frames  %i blobs  %.1f sec recorded"
+          % (blob_source, len(frames), total_blobs,
+             frames[-1][0] - frames[0][0]))
+    if args.trigger == "all":
+        trigger_names = TRIGGERS
+    else:
+        trigger_names = (args.trigger,)
+    for trigger_name in trigger_names:
+        try:
+            trigger = make_trigger(trigger_name, args.track_counter,
+                                   args.track_len_trig, args.track_time_trig,
+                                   globals().get("track_trig_lines", (0, 0)))
+        except ValueError as err:
+            print("Trigger %s Skipped - %s" % (trigger_name, err))
+            continue
+        ends, counts = replay(frames, trigger)
+        best = None
+        for _ in range(args.repeat):
+            start_time = time.time()
+            replay(frames, trigger)
+            duration = time.time() - start_time
+            if best is None or duration < best:
+                best = duration
+        print("Trigger %s  Best of %i Replays %.4f sec  %.0f updates/sec"
+              % (trigger_name, args.repeat, best, len(frames) / max(best, 1e-9)))
+        print("Events  %s" % "  ".join("%s=%i" % (kind, counts[kind])
+                                       for kind in sorted(counts)))
+        if ends:
+            speeds = [event.speed for event in ends]
+            print("Tracks  %i Ended  Speed min=%.1f ave=%.1f max=%.1f %s"
+                  % (len(ends), min(speeds), sum(speeds) / len(speeds),
+                     max(speeds), speed_units))
+        if args.widths and len(ends) < len(args.widths) * 2:
+            print("WARNING - Only %i of %i Objects Ended Their Track"
+                  % (len(ends), len(args.widths) * 2))
+        if args.verbose:
+            for event in ends:
+                print("  T%-5i %s %6.1f %s  %4i px in %.3f sec  Fit %.2f"
+                      % (event.track.id, event.direction, event.speed, speed_units,
+                         event.track_dist(), event.track_time(), event.quality))
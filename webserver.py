@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import cgi
+import mimetypes
 import os
 import socket
 import SocketServer
@@ -55,6 +56,16 @@ os.chdir(web_server_root)
 web_root = os.getcwd()
 os.chdir(BASE_DIR)
 
+# Speed images saved in pack files by speed-cam.py image_pack_on=True are
+# served from their pack by file name under the image_pack_dir url path
+pack_store = None
+pack_url = None
+if globals().get("image_pack_on", False):
+    from speed_pack import PackStore
+    pack_dir = os.path.abspath(image_pack_dir)
+    pack_store = PackStore(pack_dir)
+    pack_url = "/" + os.path.relpath(pack_dir, web_root).replace(os.sep, "/") + "/"
+
 try:
     myip = ([l for l in ([ip for ip in socket.gethostbyname_ex(socket.gethostname())[2] if not ip.startswith("127.")][:1],
                          [[(s.connect(('8.8.8.8', 53)),
@@ -77,8 +88,31 @@ else:
 
 list_title = "%s %s" % (dir_sort, dir_order)
 
+# Speed image listings show the thumbnail saved by speed-cam.py if there is one
+thumb_dir = None
+thumb_url = None
+if globals().get("image_thumb_width", 0) > 0:
+    thumb_dir = os.path.abspath(image_thumb_path)
+    thumb_url = "/" + os.path.relpath(thumb_dir, web_root).replace(os.sep, "/") + "/"
+
 class DirectoryHandler(SimpleHTTPRequestHandler):
 
+    def do_GET(self):
+        """ Serve packed speed images by seeking into their pack file """
+        if pack_store is not None and self.path.startswith(pack_url):
+            name = urllib.unquote(self.path[len(pack_url):].split("?")[0])
+            if name and "/" not in name:
+                data = pack_store.get(name)
+                if data is not None:
+                    self.send_response(200)
+                    self.send_header("Content-type",
+                                     mimetypes.guess_type(name)[0] or "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+        SimpleHTTPRequestHandler.do_GET(self)
+
     def list_directory(self, path):
         try:
             list = os.listdir(path)
@@ -161,6 +195,11 @@ VALUE="Refresh">&nbsp;&nbsp;<b>%s</b></FORM>''' % list_title)
                 linkname = os.path.join(displaypath, displayname)
                 f.write('<li><a href="%s" >%s</a></li>\n'
                         % (urllib.quote(linkname), cgi.escape(displayname)))
+            elif (thumb_dir is not None and fullname != os.path.join(thumb_dir, name) and
+                  os.path.isfile(os.path.join(thumb_dir, name))):
+                f.write('<li><a href="%s" target="imgbox"><img src="%s" alt="%s"><br>%s</a> - %s</li>\n'
+                        % (urllib.quote(linkname), urllib.quote(thumb_url + name),
+                           cgi.escape(displayname), cgi.escape(displayname), date_modified))
             else:
                 f.write('<li><a href="%s" target="imgbox">%s</a> - %s</li>\n'
                         % (urllib.quote(linkname), cgi.escape(displayname), date_modified))